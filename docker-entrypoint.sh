@@ -1,9 +1,7 @@
 #!/usr/bin/bash
 
 echo "Running Migrations"
-alembic upgrade head
+python -m gamecafe.migrate
 
 echo "Starting Backend"
-exec gunicorn 'gamecafe:create_app()' \
-    --bind '0.0.0.0:80'
-    --workers 4
+exec gunicorn --config gunicorn.conf.py
@@ -1,9 +1,16 @@
 from flask import Flask, render_template
 
+from .assets import assets
+from .autocomplete import game_names
 from .database import db
+from .fragment_cache import fragment_cache
+from .metrics import metrics
 from .model_json_provider import ModelJsonProvider
+from .popularity import view_counter
+from .profiling import profiler
 from .session import get_user
-from .views import RoleView
+from .storage import storage
+from .views import RoleView, url_toggling_arg, url_with_args
 
 
 def create_app(config="gamecafe.config.Config") -> Flask:
@@ -16,12 +23,23 @@ def create_app(config="gamecafe.config.Config") -> Flask:
         from .commands import commands
 
         db.init_app(app)
+        game_names.init_app(app)
+        assets.init_app(app)
+        fragment_cache.init_app(app)
+        storage.init_app(app)
+        metrics.init_app(app)
+        profiler.init_app(app)
+        view_counter.init_app(app)
         RoleView.register_all_subviews(app)
         app.register_blueprint(commands)
 
     @app.context_processor
     def inject_global_variables():
-        return {"user": get_user()}
+        return {
+            "user": get_user(),
+            "url_with_args": url_with_args,
+            "url_toggling_arg": url_toggling_arg,
+        }
 
     @app.errorhandler(404)
     def not_found(e):
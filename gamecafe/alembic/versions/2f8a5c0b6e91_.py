@@ -0,0 +1,41 @@
+"""index audit
+
+Revision ID: 2f8a5c0b6e91
+Revises: 9d3c6a1e7f24
+Create Date: 2026-10-19 14:02:37.554018
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2f8a5c0b6e91"
+down_revision: Union[str, None] = "9d3c6a1e7f24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f("ix_reports_game_id"), "reports", ["game_id"], unique=False)
+    op.create_index(op.f("ix_games_last_updated"), "games", ["last_updated"], unique=False)
+    op.create_index("tag_type_count_idx", "tags", ["type", "game_count"], unique=False)
+    op.create_index(
+        "collection_highlighted_idx",
+        "collections",
+        ["highlighted"],
+        unique=False,
+        postgresql_where=sa.text("highlighted = true"),
+        sqlite_where=sa.text("highlighted = 1"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("collection_highlighted_idx", table_name="collections")
+    op.drop_index("tag_type_count_idx", table_name="tags")
+    op.drop_index(op.f("ix_games_last_updated"), table_name="games")
+    op.drop_index(op.f("ix_reports_game_id"), table_name="reports")
@@ -0,0 +1,32 @@
+"""collection last viewed
+
+Revision ID: 3f9b6d2e8a45
+Revises: e4a7b2c9d031
+Create Date: 2026-10-19 19:03:51.128460
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9b6d2e8a45"
+down_revision: Union[str, None] = "e4a7b2c9d031"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("collections", sa.Column("last_viewed", sa.DateTime(), nullable=True))
+    op.create_index(
+        op.f("ix_collections_last_viewed"), "collections", ["last_viewed"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_collections_last_viewed"), table_name="collections")
+    op.drop_column("collections", "last_viewed")
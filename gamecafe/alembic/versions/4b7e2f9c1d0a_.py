@@ -0,0 +1,51 @@
+"""facet indexes and game counts
+
+Revision ID: 4b7e2f9c1d0a
+Revises: e83fd142ba83
+Create Date: 2026-10-19 09:12:44.318205
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7e2f9c1d0a"
+down_revision: Union[str, None] = "e83fd142ba83"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("game_tag_tag_idx", "game_tag_table", ["tag_id", "game_id"], unique=False)
+    op.create_index(
+        "publisher_game_publisher_idx",
+        "publisher_game_table",
+        ["publisher_id", "game_id"],
+        unique=False,
+    )
+    op.add_column("tags", sa.Column("game_count", sa.Integer(), server_default="0", nullable=False))
+    op.add_column(
+        "publishers", sa.Column("game_count", sa.Integer(), server_default="0", nullable=False)
+    )
+
+    op.execute(
+        "UPDATE tags SET game_count = "
+        "(SELECT count(*) FROM game_tag_table WHERE game_tag_table.tag_id = tags.id)"
+    )
+    op.execute(
+        "UPDATE publishers SET game_count = "
+        "(SELECT count(*) FROM publisher_game_table "
+        "WHERE publisher_game_table.publisher_id = publishers.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("publishers", "game_count")
+    op.drop_column("tags", "game_count")
+    op.drop_index("publisher_game_publisher_idx", table_name="publisher_game_table")
+    op.drop_index("game_tag_tag_idx", table_name="game_tag_table")
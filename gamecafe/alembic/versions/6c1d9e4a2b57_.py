@@ -0,0 +1,47 @@
+"""game details
+
+Revision ID: 6c1d9e4a2b57
+Revises: 2f8a5c0b6e91
+Create Date: 2026-10-19 16:21:08.310492
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6c1d9e4a2b57"
+down_revision: Union[str, None] = "2f8a5c0b6e91"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("games", sa.Column("min_players", sa.Integer(), nullable=True))
+    op.add_column("games", sa.Column("max_players", sa.Integer(), nullable=True))
+    op.add_column("games", sa.Column("playing_time", sa.Integer(), nullable=True))
+    op.add_column("games", sa.Column("weight", sa.Float(), nullable=True))
+    op.add_column("games", sa.Column("year_published", sa.Integer(), nullable=True))
+    op.create_index(
+        "game_players_time_idx",
+        "games",
+        ["min_players", "max_players", "playing_time"],
+        unique=False,
+    )
+    op.create_index("game_time_weight_idx", "games", ["playing_time", "weight"], unique=False)
+    op.create_index("game_year_idx", "games", ["year_published"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("game_year_idx", table_name="games")
+    op.drop_index("game_time_weight_idx", table_name="games")
+    op.drop_index("game_players_time_idx", table_name="games")
+    op.drop_column("games", "year_published")
+    op.drop_column("games", "weight")
+    op.drop_column("games", "playing_time")
+    op.drop_column("games", "max_players")
+    op.drop_column("games", "min_players")
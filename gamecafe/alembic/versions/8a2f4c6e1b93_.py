@@ -0,0 +1,30 @@
+"""game image url
+
+Revision ID: 8a2f4c6e1b93
+Revises: 3f9b6d2e8a45
+Create Date: 2026-10-19 19:48:16.550371
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a2f4c6e1b93"
+down_revision: Union[str, None] = "3f9b6d2e8a45"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("games", sa.Column("image_url", sa.String(), nullable=True))
+    op.create_index(op.f("ix_games_image_url"), "games", ["image_url"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_games_image_url"), table_name="games")
+    op.drop_column("games", "image_url")
@@ -0,0 +1,32 @@
+"""game similarity reverse index
+
+Revision ID: 8ef428932250
+Revises: 926a5255feea
+Create Date: 2026-10-20 10:02:37.518840
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8ef428932250"
+down_revision: Union[str, None] = "926a5255feea"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "game_similarity_similar_idx",
+        "game_similarities",
+        ["similar_game_id", "game_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("game_similarity_similar_idx", table_name="game_similarities")
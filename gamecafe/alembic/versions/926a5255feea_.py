@@ -0,0 +1,38 @@
+"""game modified
+
+Revision ID: 926a5255feea
+Revises: a9c4e2f7b318
+Create Date: 2026-10-20 09:14:52.603118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "926a5255feea"
+down_revision: Union[str, None] = "a9c4e2f7b318"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("games", sa.Column("modified", sa.DateTime(), nullable=True))
+    op.execute("UPDATE games SET modified = last_updated")
+
+    # SQLite can neither add a NOT NULL column with a non-constant default nor alter one in place
+    with op.batch_alter_table("games") as batch_op:
+        batch_op.alter_column(
+            "modified", existing_type=sa.DateTime(), nullable=False, server_default=sa.func.now()
+        )
+
+    op.create_index(op.f("ix_games_modified"), "games", ["modified"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_games_modified"), table_name="games")
+    op.drop_column("games", "modified")
@@ -0,0 +1,43 @@
+"""collection game counts
+
+Revision ID: 9d3c6a1e7f24
+Revises: 4b7e2f9c1d0a
+Create Date: 2026-10-19 11:40:02.917364
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d3c6a1e7f24"
+down_revision: Union[str, None] = "4b7e2f9c1d0a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "collections", sa.Column("game_count", sa.Integer(), server_default="0", nullable=False)
+    )
+    op.create_index(
+        "collection_games_collection_idx",
+        "collection_games",
+        ["collection_id", "game_id"],
+        unique=False,
+    )
+
+    op.execute(
+        "UPDATE collections SET game_count = "
+        "(SELECT count(*) FROM collection_games "
+        "WHERE collection_games.collection_id = collections.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("collection_games_collection_idx", table_name="collection_games")
+    op.drop_column("collections", "game_count")
@@ -0,0 +1,41 @@
+"""game view counts
+
+Revision ID: a9c4e2f7b318
+Revises: f1d8b3a6c274
+Create Date: 2026-10-19 22:47:09.281736
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a9c4e2f7b318"
+down_revision: Union[str, None] = "f1d8b3a6c274"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "game_view_counts",
+        sa.Column("game_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("views", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["game_id"], ["games.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("game_id", "day"),
+    )
+    op.add_column(
+        "games", sa.Column("weekly_views", sa.Integer(), server_default="0", nullable=False)
+    )
+    op.create_index("game_weekly_views_idx", "games", ["weekly_views", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("game_weekly_views_idx", table_name="games")
+    op.drop_column("games", "weekly_views")
+    op.drop_table("game_view_counts")
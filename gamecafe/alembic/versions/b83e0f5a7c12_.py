@@ -0,0 +1,40 @@
+"""game similarities
+
+Revision ID: b83e0f5a7c12
+Revises: 6c1d9e4a2b57
+Create Date: 2026-10-19 17:05:44.902113
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b83e0f5a7c12"
+down_revision: Union[str, None] = "6c1d9e4a2b57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "game_similarities",
+        sa.Column("game_id", sa.Integer(), nullable=False),
+        sa.Column("similar_game_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["game_id"], ["games.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["similar_game_id"], ["games.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("game_id", "similar_game_id"),
+    )
+    op.create_index(
+        "game_similarity_score_idx", "game_similarities", ["game_id", "score"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("game_similarity_score_idx", table_name="game_similarities")
+    op.drop_table("game_similarities")
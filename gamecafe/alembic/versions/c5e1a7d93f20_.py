@@ -0,0 +1,28 @@
+"""game left collection
+
+Revision ID: c5e1a7d93f20
+Revises: 8a2f4c6e1b93
+Create Date: 2026-10-19 21:12:40.118203
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e1a7d93f20"
+down_revision: Union[str, None] = "8a2f4c6e1b93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("games", sa.Column("left_collection", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("games", "left_collection")
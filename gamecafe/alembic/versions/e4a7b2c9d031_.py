@@ -0,0 +1,54 @@
+"""jobs
+
+Revision ID: e4a7b2c9d031
+Revises: b83e0f5a7c12
+Create Date: 2026-10-19 18:12:30.771905
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a7b2c9d031"
+down_revision: Union[str, None] = "b83e0f5a7c12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "jobs",
+        sa.Column("task", sa.String(), nullable=False),
+        sa.Column("arguments", sa.JSON(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", name="status"),
+            nullable=False,
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_after", sa.DateTime(), nullable=False),
+        sa.Column("locked_by", sa.String(), nullable=True),
+        sa.Column("heartbeat", sa.DateTime(), nullable=True),
+        sa.Column("progress", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("message", sa.String(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("started", sa.DateTime(), nullable=True),
+        sa.Column("finished", sa.DateTime(), nullable=True),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("job_status_run_after_idx", "jobs", ["status", "run_after"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("job_status_run_after_idx", table_name="jobs")
+    op.drop_table("jobs")
+    sa.Enum(name="status").drop(op.get_bind(), checkfirst=True)
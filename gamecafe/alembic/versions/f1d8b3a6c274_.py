@@ -0,0 +1,29 @@
+"""tag and publisher popularity indexes
+
+Revision ID: f1d8b3a6c274
+Revises: c5e1a7d93f20
+Create Date: 2026-10-19 22:03:51.604419
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f1d8b3a6c274"
+down_revision: Union[str, None] = "c5e1a7d93f20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("tag_count_idx", "tags", ["game_count", "id"], unique=False)
+    op.create_index("publisher_count_idx", "publishers", ["game_count", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("publisher_count_idx", table_name="publishers")
+    op.drop_index("tag_count_idx", table_name="tags")
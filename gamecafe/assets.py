@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import shutil
+from pathlib import Path
+
+from flask import Flask, abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+DIST_DIRECTORY = "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".json", ".svg", ".ico"}
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _compress(path: Path):
+    # Only the build needs brotli, so web workers never import it
+    import brotli
+
+    data = path.read_bytes()
+
+    # mtime=0 keeps the output reproducible between builds
+    with gzip.GzipFile(path.with_name(path.name + ".gz"), "wb", 9, mtime=0) as f:
+        f.write(data)
+
+    path.with_name(path.name + ".br").write_bytes(brotli.compress(data))
+
+
+def build(static_folder: str | Path) -> dict[str, str]:
+    """Copy every static file to `dist/` under a content-hashed name and write the manifest.
+
+    Text assets are also written gzip and brotli precompressed next to the hashed file.
+    """
+    static_folder = Path(static_folder)
+    dist = static_folder / DIST_DIRECTORY
+
+    shutil.rmtree(dist, ignore_errors=True)
+
+    manifest = {}
+
+    for path in sorted(static_folder.rglob("*")):
+        if not path.is_file() or dist in path.parents:
+            continue
+
+        relative = path.relative_to(static_folder)
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+        hashed = relative.with_name(f"{path.stem}.{digest}{path.suffix}")
+
+        target = dist / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+
+        if path.suffix in COMPRESSIBLE_SUFFIXES:
+            _compress(target)
+
+        manifest[relative.as_posix()] = hashed.as_posix()
+
+    (dist / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+    return manifest
+
+
+class Assets:
+    """Serves the output of `build` and points `url_for('static', ...)` in templates at it.
+
+    Without a built manifest templates keep using Flask's plain static route.
+    """
+
+    ENDPOINT = "assets"
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, app: Flask | None = None) -> None:
+        self.manifest: dict[str, str] = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.dist = Path(app.static_folder) / DIST_DIRECTORY
+
+        try:
+            self.manifest = json.loads((self.dist / MANIFEST_NAME).read_text())
+        except (OSError, ValueError):
+            self.manifest = {}
+
+        self.files = set(self.manifest.values())
+
+        app.add_url_rule("/assets/<path:filename>", self.ENDPOINT, self.send)
+
+        if self.manifest:
+            app.jinja_env.globals["url_for"] = self.url_for
+
+    def url_for(self, endpoint: str, **values):
+        if endpoint == "static" and (
+            hashed := self.manifest.get(values.get("filename", "").lstrip("/"))
+        ):
+            values["filename"] = hashed
+            endpoint = self.ENDPOINT
+
+        return url_for(endpoint, **values)
+
+    def send(self, filename: str):
+        if filename not in self.files or (path := safe_join(str(self.dist), filename)) is None:
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        encoding = None
+
+        for name, suffix in self.ENCODINGS:
+            # `in` would also match encodings the client refuses with q=0
+            if request.accept_encodings.quality(name) > 0 and Path(path + suffix).is_file():
+                path += suffix
+                encoding = name
+                break
+
+        response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+
+        response.content_encoding = encoding
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+
+        return response
+
+
+assets = Assets()
+
+
+if __name__ == "__main__":
+    manifest = build(Path(__file__).parent / "static")
+    print(f"Built {len(manifest)} assets")
@@ -0,0 +1,189 @@
+import heapq
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import Flask, current_app
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .models import Game, db
+
+AUTOCOMPLETE_REFRESH_SECONDS_KEY = "AUTOCOMPLETE_REFRESH_SECONDS"
+
+# How far back each refresh looks past the newest `Game.modified` it has seen, as another process
+# may commit an older timestamp after a newer one
+MODIFIED_OVERLAP = timedelta(minutes=5)
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+
+    return stripped.casefold()
+
+
+def tokenize(text: str) -> list[str]:
+    return "".join(c if c.isalnum() else " " for c in normalize(text)).split()
+
+
+class NameIndex:
+    """Per-process word-prefix index of game names.
+
+    Every word of every name is kept in one sorted list of `(word, game_id)` pairs, so the games
+    matching a prefix are a contiguous slice found with a binary search.
+    """
+
+    def __init__(self, app: Flask | None = None) -> None:
+        self._lock = Lock()
+        self._names: dict[int, tuple[str, str]] = {}
+        self._words: list[tuple[str, int]] = []
+        self._modified: datetime | None = None
+        self._checked_at = 0.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault(AUTOCOMPLETE_REFRESH_SECONDS_KEY, 60)
+
+        with app.app_context():
+            try:
+                self.build()
+            except SQLAlchemyError:
+                app.logger.warning("Game name index not built, the games table is unavailable")
+            finally:
+                db.session.remove()
+
+    def build(self):
+        _, _, modified = Game.version()
+        rows = db.session.execute(select(Game.id, Game.name)).all()
+
+        names = {game_id: (name, normalize(name)) for game_id, name in rows}
+        words = sorted(
+            (word, game_id) for game_id, (name, _) in names.items() for word in set(tokenize(name))
+        )
+
+        with self._lock:
+            self._names = names
+            self._words = words
+            self._modified = modified
+            self._checked_at = time.monotonic()
+
+    def _remove(self, game_id: int):
+        if (entry := self._names.pop(game_id, None)) is None:
+            return
+
+        for word in set(tokenize(entry[0])):
+            i = bisect_left(self._words, (word, game_id))
+
+            if i < len(self._words) and self._words[i] == (word, game_id):
+                del self._words[i]
+
+    def update(self, game_id: int, name: str | None):
+        """Replace the indexed name of `game_id`, removing it when `name` is `None`."""
+        with self._lock:
+            self._remove(game_id)
+
+            if name is not None:
+                self._names[game_id] = (name, normalize(name))
+
+                for word in set(tokenize(name)):
+                    insort(self._words, (word, game_id))
+
+    def _refresh_if_stale(self):
+        interval = current_app.config[AUTOCOMPLETE_REFRESH_SECONDS_KEY]
+
+        if time.monotonic() - self._checked_at < interval:
+            return
+
+        self._checked_at = time.monotonic()
+
+        # Catch changes committed by other processes, such as `update-games`. The refresh scheduler
+        # keeps moving `modified`, so only recently modified games are read, not every name.
+        count, _, modified = Game.version()
+
+        if self._modified is not None:
+            stmt = select(Game.id, Game.name).where(
+                Game.modified >= self._modified - MODIFIED_OVERLAP
+            )
+
+            for game_id, name in db.session.execute(stmt):
+                if (entry := self._names.get(game_id)) is None or entry[0] != name:
+                    self.update(game_id, name)
+
+            self._modified = modified
+
+        # Removed games leave no `modified` behind, and a failed first build left no starting point
+        if count != len(self._names) or self._modified is None:
+            self.build()
+
+    def _prefix_matches(self, prefix: str) -> set[int]:
+        matches = set()
+
+        for i in range(bisect_left(self._words, (prefix,)), len(self._words)):
+            word, game_id = self._words[i]
+
+            if not word.startswith(prefix):
+                break
+
+            matches.add(game_id)
+
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[int, str]]:
+        words = sorted(tokenize(query), key=len, reverse=True)
+        normalized_query = normalize(query).strip()
+
+        if not words:
+            return []
+
+        self._refresh_if_stale()
+
+        with self._lock:
+            candidates = self._prefix_matches(words[0])
+
+            for word in words[1:]:
+                if not candidates:
+                    break
+
+                candidates &= self._prefix_matches(word)
+
+            def rank(game_id):
+                name, normalized = self._names[game_id]
+
+                return (not normalized.startswith(normalized_query), len(name), normalized, game_id)
+
+            best = heapq.nsmallest(limit, candidates, key=rank)
+
+            return [(game_id, self._names[game_id][0]) for game_id in best]
+
+
+game_names = NameIndex()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_game_name_changes(session, flush_context):
+    changes = session.info.setdefault("game_name_changes", {})
+
+    for game in session.new | session.dirty:
+        if isinstance(game, Game):
+            changes[game.id] = game.name
+
+    for game in session.deleted:
+        if isinstance(game, Game):
+            changes[game.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_game_name_changes(session):
+    for game_id, name in session.info.pop("game_name_changes", {}).items():
+        game_names.update(game_id, name)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_game_name_changes(session, previous_transaction):
+    session.info.pop("game_name_changes", None)
@@ -1,15 +1,23 @@
 import time
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass
-from pathlib import Path
 
 import requests
 import requests_cache
 
+from .metrics import bgg_cache_hits, bgg_requests, bgg_retries, bgg_throttled, metrics
+from .storage import Storage
+
+# Statuses BGG answers with when it wants clients to slow down
+THROTTLE_STATUSES = {429, 503}
+
 
 class BoardGameGeek:
     BASE_URL = "https://boardgamegeek.com/xmlapi2"
 
+    # The most ids BGG accepts in one /thing request
+    THING_BATCH_SIZE = 20
+
     @dataclass
     class Publisher:
         id: int
@@ -29,43 +37,71 @@ class BoardGameGeek:
         publishers: list["BoardGameGeek.Publisher"]
         tags: list["BoardGameGeek.Tag"]
         comment: str | None = None
-
-        def save_image(self, image_path: Path):
+        min_players: int | None = None
+        max_players: int | None = None
+        playing_time: int | None = None
+        weight: float | None = None
+        year_published: int | None = None
+
+        def save_image(self, storage: Storage):
+            """Download the cover into `storage`, returning its content-addressed key."""
             if self.image_url is None:
                 return None
 
             resp = requests.get(self.image_url, stream=True)
+            resp.raise_for_status()
+            resp.raw.decode_content = True
 
-            with image_path.open("wb") as f:
-                for chunk in resp.iter_content(1024):
-                    f.write(chunk)
+            with resp:
+                return storage.save_content(resp.raw, resp.headers.get("Content-Type"))
 
-            return image_path
+    @dataclass
+    class CollectionItem:
+        id: int
+        name: str
+        comment: str | None = None
 
-    @classmethod
-    def get_game(cls, game_id, rc: requests_cache.CachedSession = None):
-        game_id = str(game_id)
+    @staticmethod
+    def _record(endpoint: str, resp: requests.Response, attempt: int):
+        bgg_requests.inc(endpoint=endpoint)
 
-        rc = rc or requests_cache.CachedSession(stale_if_error=True)
+        if attempt > 0:
+            bgg_retries.inc(endpoint=endpoint)
 
-        sleep = 2
-        while (resp := rc.get(f"{cls.BASE_URL}/thing", params={"id": game_id})).status_code != 200:
-            time.sleep(sleep)
-            sleep *= 2
+        if getattr(resp, "from_cache", False):
+            bgg_cache_hits.inc(endpoint=endpoint)
 
-        root = ET.fromstring(resp.content)
+        if resp.status_code in THROTTLE_STATUSES:
+            bgg_throttled.inc(endpoint=endpoint)
 
-        name = root.find('.//*name[@type="primary"]').attrib["value"]
-        image_url_element = root.find(".//*image")
+        metrics.maybe_flush()
+
+    @staticmethod
+    def _value(root: ET.Element, path: str, cast: type):
+        """`cast` of the `value` attribute at `path`, `None` when missing or unset (BGG uses 0)."""
+        if (element := root.find(path)) is None:
+            return None
+
+        try:
+            value = cast(element.attrib["value"])
+        except (KeyError, ValueError):
+            return None
+
+        return value or None
+
+    @classmethod
+    def _parse_game(cls, item: ET.Element) -> "BoardGameGeek.Game":
+        name = item.find('name[@type="primary"]').attrib["value"]
+        image_url_element = item.find("image")
         image_url = image_url_element.text if image_url_element is not None else None
-        publishers_elements = root.findall('.//*link[@type="boardgamepublisher"]')
+        publishers_elements = item.findall('link[@type="boardgamepublisher"]')
 
         publishers = [
             cls.Publisher(int(pub.attrib["id"]), pub.attrib["value"]) for pub in publishers_elements
         ]
 
-        tag_elements = root.findall('.//*link[@type="boardgamecategory"]') + root.findall(
-            './/*link[@type="boardgamemechanic"]'
+        tag_elements = item.findall('link[@type="boardgamecategory"]') + item.findall(
+            'link[@type="boardgamemechanic"]'
         )
 
         tags = [
@@ -73,44 +109,107 @@ class BoardGameGeek:
             for tag in tag_elements
         ]
 
-        return cls.Game(int(game_id), name, image_url, publishers, tags)
+        return cls.Game(
+            int(item.attrib["id"]),
+            name,
+            image_url,
+            publishers,
+            tags,
+            min_players=cls._value(item, "minplayers", int),
+            max_players=cls._value(item, "maxplayers", int),
+            playing_time=cls._value(item, "playingtime", int),
+            weight=cls._value(item, "statistics/ratings/averageweight", float),
+            year_published=cls._value(item, "yearpublished", int),
+        )
+
+    @classmethod
+    def get_games(
+        cls, game_ids: list[int], rc: requests_cache.CachedSession = None, progress=None
+    ) -> list[Game]:
+        """Fetch the details of `game_ids`, `THING_BATCH_SIZE` games per request."""
+        rc = rc or requests_cache.CachedSession(stale_if_error=True)
+
+        games = []
+
+        for start in range(0, len(game_ids), cls.THING_BATCH_SIZE):
+            batch = game_ids[start : start + cls.THING_BATCH_SIZE]
+
+            if progress is not None:
+                progress(start, len(game_ids), f"Fetching games {start + 1}-{start + len(batch)}")
+
+            if start > 0:
+                time.sleep(0.2)
+
+            sleep = 2
+            params = {"id": ",".join(str(game_id) for game_id in batch), "stats": 1}
+            attempt = 0
+
+            while True:
+                resp = rc.get(f"{cls.BASE_URL}/thing", params=params)
+                cls._record("thing", resp, attempt)
+
+                if resp.status_code == 200:
+                    break
+
+                time.sleep(sleep)
+                sleep *= 2
+                attempt += 1
+
+            root = ET.fromstring(resp.content)
+
+            games.extend(cls._parse_game(item) for item in root.findall("item"))
+
+        return games
 
     @classmethod
-    def get_collection(cls, username: str, rc: requests_cache.CachedSession = None) -> list[Game]:
+    def get_game(cls, game_id, rc: requests_cache.CachedSession = None):
+        return cls.get_games([int(game_id)], rc=rc)[0]
+
+    @classmethod
+    def get_collection(
+        cls, username: str, rc: requests_cache.CachedSession = None
+    ) -> list[CollectionItem]:
+        """The games in `username`'s BGG collection, without their details."""
         resp = None
 
         rc = rc or requests_cache.CachedSession(stale_if_error=True)
 
         with rc.cache_disabled():
-            while (
-                resp := rc.get(
+            attempt = 0
+
+            # 202 means the collection is still being prepared
+            while True:
+                resp = rc.get(
                     f"{cls.BASE_URL}/collection",
                     params={"username": username, "excludesubtype": "boardgameexpansion"},
                 )
-            ).status_code == 202:
-                print(resp.text)
+                cls._record("collection", resp, attempt)
+
+                if resp.status_code != 202:
+                    break
+
                 time.sleep(5)
+                attempt += 1
 
         if resp.status_code != 200:
             raise Exception(resp.text)
 
         root = ET.fromstring(resp.content)
 
-        game_elements = root.findall("item")
+        items = {}
 
-        games = []
+        # A game owned twice is listed twice
+        for game_element in root.findall("item"):
+            game_id = int(game_element.attrib["objectid"])
+            comment_element = game_element.find("comment")
 
-        for i, game_element in enumerate(game_elements):
-            game_id = game_element.attrib["objectid"]
+            items.setdefault(
+                game_id,
+                cls.CollectionItem(
+                    game_id,
+                    game_element.findtext("name"),
+                    comment_element.text if comment_element is not None else None,
+                ),
+            )
 
-            print(f"Fetching game_id {game_id} - {i}/{len(game_elements)}")
-            game = cls.get_game(game_id, rc=rc)
-
-            if (comment_element := game_element.find("comment")) is not None:
-                game.comment = comment_element.text
-
-            games.append(game)
-
-            time.sleep(0.2)
-
-        return games
+        return list(items.values())
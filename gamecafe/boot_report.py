@@ -0,0 +1,67 @@
+"""Report what importing the web app costs, failing when CLI-only modules leak into it.
+
+Run as `python -m gamecafe.boot_report [--budget-ms N]`. The import happens in a fresh interpreter
+started with `-X importtime`, so the numbers match a cold gunicorn worker.
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Modules only the CLI commands need; a web worker importing any of them is a boot regression
+CLI_ONLY_MODULES = ("gamecafe.board_game_geek", "requests", "requests_cache", "boto3")
+
+BOOT_IMPORTS = "import gamecafe, gamecafe.commands"
+
+
+def measure() -> dict[str, tuple[int, int]]:
+    """`{module: (self_us, cumulative_us)}` for every module the web app imports."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT_IMPORTS],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    timings = {}
+
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        self_us, cumulative_us, module = line.removeprefix("import time:").split("|")
+        timings[module.strip()] = (int(self_us), int(cumulative_us))
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings = measure()
+    total_ms = sum(self_us for self_us, _ in timings.values()) / 1000
+
+    print(f"{len(timings)} modules imported in {total_ms:.1f} ms\n")
+    print(f"{'cumulative ms':>14}  module")
+
+    by_cumulative = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+
+    for module, (_, cumulative_us) in by_cumulative[: args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}  {module}")
+
+    failures = [f"CLI-only module imported: {m}" for m in CLI_ONLY_MODULES if m in timings]
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f"Import time {total_ms:.1f} ms exceeds budget of {args.budget_ms} ms")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
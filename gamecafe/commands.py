@@ -1,90 +1,130 @@
-from datetime import datetime
-from pathlib import Path
-from uuid import uuid4
+from datetime import timedelta
 
 import click
 from flask import Blueprint, current_app
 
-from .board_game_geek import BoardGameGeek
-from .models import Game, Publisher, Tag, db
-
+# Every web worker imports this module, so the BGG client (and `requests` with it) and other
+# CLI-only modules are imported inside the commands that use them.
 commands = Blueprint("commands", __name__, cli_group=None)
 
-root_image_path = Path(current_app.config.get("IMAGE_STORAGE_ROOT"))
 
+@commands.cli.command("import-collection")
+@click.argument("username")
+@click.option("--mark-missing", is_flag=True, help="Flag games no longer in the collection")
+def import_collection(username, mark_missing: bool):
+    from .tasks import import_collection
+
+    import_collection(username, mark_missing=mark_missing)
 
-def get_publishers(bgg_publishers: list[BoardGameGeek.Publisher]) -> list[Publisher]:
-    pubs = []
-    for bgg_publisher in bgg_publishers:
-        if (publisher := Publisher.get_by_bgg_id(bgg_publisher.id)) is None:
-            publisher = Publisher(bgg_publisher.id, bgg_publisher.name).save(commit=False)
 
-        pubs.append(publisher)
+@commands.cli.command("update-games")
+@click.argument("before_date")
+def update_games(before_date: str):
+    from .tasks import update_games
 
-    return pubs
+    update_games(before_date)
 
 
-TAG_TYPE_MAP = {"boardgamecategory": Tag.Type.CATEGORY, "boardgamemechanic": Tag.Type.MECHANIC}
+@commands.cli.command("build-similar-games")
+@click.option("-k", "--top", default=8, help="Neighbours stored per game")
+def build_similar_games(top: int):
+    from .similarity import build_all
 
+    print(f"Stored {build_all(top)} similar game pairs")
 
-def get_tags(bgg_tags: list[BoardGameGeek.Tag]) -> list[Tag]:
-    tags = []
-    for bgg_tag in bgg_tags:
-        if (tag := Tag.get_by_bgg_id(bgg_tag.id)) is None:
-            tag_type = TAG_TYPE_MAP[bgg_tag.type]
 
-            tag = Tag(bgg_tag.id, bgg_tag.name, tag_type).save(commit=False)
+@commands.cli.command("run-worker")
+@click.option("--poll", default=5.0, help="Seconds to wait when the queue is empty")
+@click.option("--once", is_flag=True, help="Exit once no job is runnable")
+def run_worker(poll: float, once: bool):
+    from .jobs import work
 
-        tags.append(tag)
+    work(poll_seconds=poll, once=once)
 
-    return tags
 
+@commands.cli.command("refresh-scheduler")
+@click.option(
+    "--per-hour", type=int, help="BGG requests per hour, REFRESH_REQUESTS_PER_HOUR by default"
+)
+@click.option("--limit", type=int, help="Exit after refreshing this many games")
+def refresh_scheduler(per_hour: int | None, limit: int | None):
+    from .scheduler import run
 
-@commands.cli.command("import-collection")
-@click.argument("username")
-def import_collection(username):
-    print("Fetching collection")
-    games = BoardGameGeek.get_collection(username)
+    run(per_hour, limit)
 
-    for bgg_game in games:
-        print(f"Processing game: {game.name}")
 
-        if (game := Game.get_by_bgg_id(game.id)) is None:
-            image_path = game.save_image(root_image_path / uuid4().hex)
-            image_path = str(image_path) if image_path else None
+@commands.cli.command("gc-images")
+@click.option("--grace-hours", default=24, help="Keep files modified more recently than this")
+@click.option("--dry-run", is_flag=True, help="Only list the files that would be removed")
+def gc_images(grace_hours: int, dry_run: bool):
+    from .images import collect_garbage
 
-            game = Game(game.id, game.name, image_path)
+    removed = collect_garbage(timedelta(hours=grace_hours), dry_run=dry_run)
 
-            if bgg_game.comment:
-                game.location = game.comment
+    print(f"{'Would remove' if dry_run else 'Removed'} {removed} unreferenced images")
 
-        game.publishers = get_publishers(game.publishers)
-        game.tags = get_tags(game.tags)
 
-        game.save()
+@commands.cli.command("migrate-images")
+def migrate_images():
+    from .images import migrate_legacy_keys
 
+    print(f"Migrated {migrate_legacy_keys()} images, run gc-images to remove the old files")
+
+
+@commands.cli.command("optimize-database")
+def optimize_database():
+    from .database import db
+
+    if db.sqlite_pragmas is None:
+        print("Nothing to do, the database is not SQLite")
+        return
+
+    db.optimize(checkpoint="TRUNCATE")
+
+    print("Optimized the database and truncated its write-ahead log")
+
+
+@commands.cli.command("export-snapshot")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--images/--no-images", default=True, help="Include image files")
+def export_snapshot(path: str, images: bool):
+    from .snapshot import export_snapshot
+
+    export_snapshot(path, include_images=images)
+
+
+@commands.cli.command("import-snapshot")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_snapshot(path: str):
+    from .snapshot import SnapshotError, import_snapshot
+
+    try:
+        import_snapshot(path)
+    except SnapshotError as e:
+        raise click.ClickException(str(e))
 
-@commands.cli.command("update-games")
-@click.argument("before_date")
-def update_games(before_date: str):
-    dt = datetime.strptime(before_date, r"%Y-%m-%d").date()
 
-    stmt = Game.select().where(Game.last_updated <= dt)
+@commands.cli.command("check-query-plans")
+def check_query_plans():
+    from .query_plans import full_scans
 
-    games = db.session.scalars(stmt).all()
+    failures = 0
 
-    for game in games:
-        bgg_game = BoardGameGeek.get_game(game.bgg_id)
+    for name, scans in full_scans().items():
+        if scans:
+            failures += 1
+            print(f"FULL SCAN  {name}: {'; '.join(scans)}")
+        else:
+            print(f"ok         {name}")
 
-        if bgg_game.image_url is not None and game.image_path is None:
-            image_path = str(bgg_game.save_image(root_image_path / uuid4().hex))
-            game.image_path = image_path
+    if failures:
+        raise click.ClickException(f"{failures} hot queries fall back to a full table scan")
 
-        game.publishers = get_publishers(bgg_game.publishers)
-        game.tags = get_tags(bgg_game.tags)
 
-        game.last_updated = datetime.now()
+@commands.cli.command("build-assets")
+def build_assets():
+    from .assets import build
 
-        game.save()
+    manifest = build(current_app.static_folder)
 
-    db.session.commit()
+    print(f"Built {len(manifest)} assets")
@@ -28,4 +28,21 @@ if not os.environ.get("SECRET_KEY"):
 class Config(object):
     SECRET_KEY = os.environ.get("SECRET_KEY", key)
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URI", "sqlite:////config/database.db")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_CACHE_SIZE_KIB = int(os.environ.get("SQLITE_CACHE_SIZE_KIB", 20000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
     IMAGE_STORAGE_ROOT = os.environ.get("IMAGE_STORAGE_ROOT", "/data")
+    IMAGE_STORAGE_BACKEND = os.environ.get("IMAGE_STORAGE_BACKEND", "local")
+    S3_BUCKET = os.environ.get("S3_BUCKET")
+    S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
+    S3_REGION = os.environ.get("S3_REGION")
+    S3_PUBLIC_URL = os.environ.get("S3_PUBLIC_URL")
+    S3_PRESIGN_SECONDS = int(os.environ.get("S3_PRESIGN_SECONDS", 3600))
+    JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 300))
+    REFRESH_REQUESTS_PER_HOUR = int(os.environ.get("REFRESH_REQUESTS_PER_HOUR", 120))
+    REFRESH_MIN_AGE_HOURS = int(os.environ.get("REFRESH_MIN_AGE_HOURS", 24))
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    PROFILE_DIR = os.environ.get("PROFILE_DIR")
+    PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 50))
+    VIEW_FLUSH_SECONDS = int(os.environ.get("VIEW_FLUSH_SECONDS", 30))
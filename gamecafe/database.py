@@ -1,9 +1,35 @@
-from flask import Flask
-from sqlalchemy import create_engine
+import time
+
+from flask import Flask, current_app, has_request_context, request
+from sqlalchemy import create_engine, event, pool
 from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
 
+from .metrics import db_pool_checked_out, db_pool_size, db_queries, db_query_seconds, metrics
+
 SQLALCHEMY_DATABASE_URI_KEY = "SQLALCHEMY_DATABASE_URI"
 
+SQLITE_BUSY_TIMEOUT_MS_KEY = "SQLITE_BUSY_TIMEOUT_MS"
+SQLITE_CACHE_SIZE_KIB_KEY = "SQLITE_CACHE_SIZE_KIB"
+SQLITE_MMAP_SIZE_KEY = "SQLITE_MMAP_SIZE"
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _writes_expected() -> bool:
+    """Whether the current transaction should take SQLite's write lock when it begins.
+
+    Form posts and API changes lock up front, so concurrent ones queue on `busy_timeout`. Upgrading
+    a read transaction to a write instead fails at once with "database is locked" whenever another
+    connection committed since it started reading. Views whose posts only read, like logging in,
+    set `WRITES = False` so they do not hold the lock while they run.
+    """
+    if not has_request_context() or request.method in READ_METHODS:
+        return False
+
+    view = current_app.view_functions.get(request.endpoint)
+
+    return getattr(getattr(view, "view_class", None), "WRITES", True)
+
 
 class Database:
     def __init__(self, app: Flask | None = None) -> None:
@@ -20,9 +46,105 @@ class Database:
 
         self.Base.query = self.session.query_property()
 
+        self._instrument()
+
+        self.sqlite_pragmas = None
+
+        if self.engine.dialect.name == "sqlite":
+            self.sqlite_pragmas = {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "busy_timeout": app.config.get(SQLITE_BUSY_TIMEOUT_MS_KEY, 5000),
+                "cache_size": -app.config.get(SQLITE_CACHE_SIZE_KIB_KEY, 20000),
+                "mmap_size": app.config.get(SQLITE_MMAP_SIZE_KEY, 256 * 1024 * 1024),
+                "foreign_keys": "ON",
+            }
+
+            self._configure_sqlite(self.engine)
+
         @app.teardown_appcontext
         def shutdown_session(exception=None):
             self.session.remove()
 
+    def _instrument(self):
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+        @event.listens_for(self.engine, "after_cursor_execute")
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            db_queries.inc()
+            db_query_seconds.inc(time.perf_counter() - conn.info["query_start"].pop())
+
+        @event.listens_for(self.engine, "handle_error")
+        def failed_query(context):
+            if context.connection is not None and context.connection.info.get("query_start"):
+                context.connection.info["query_start"].pop()
+
+        def pool_usage():
+            if isinstance(engine_pool := self.engine.pool, pool.QueuePool):
+                db_pool_checked_out.set(engine_pool.checkedout())
+                db_pool_size.set(engine_pool.size())
+
+        metrics.on_collect(pool_usage)
+
+    def _configure_sqlite(self, engine):
+        """Apply `sqlite_pragmas` to every connection, and open write requests' transactions
+        with `BEGIN IMMEDIATE`.
+
+        Everything else keeps the driver's behaviour of reading outside a transaction and only
+        beginning one before the first write. Page views never pin a snapshot, and neither do
+        tasks that hold their session open across BGG calls while reporting progress through a
+        second connection.
+        """
+
+        @event.listens_for(engine, "connect")
+        def configure_connection(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+
+            for pragma, value in self.sqlite_pragmas.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+
+            cursor.close()
+
+        if engine is not self.engine:
+            return
+
+        @event.listens_for(engine, "begin")
+        def begin(conn):
+            dbapi_connection = conn.connection.dbapi_connection
+
+            if _writes_expected():
+                # Without the driver's implicit BEGIN, which would come too late and deferred
+                dbapi_connection.isolation_level = None
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            else:
+                dbapi_connection.isolation_level = ""
+
+    def optimize(self, checkpoint: str = "PASSIVE"):
+        """Refresh SQLite's planner statistics and checkpoint the WAL; a no-op on other databases.
+
+        A PASSIVE checkpoint never waits. TRUNCATE waits for readers and writers, then empties the
+        WAL file, so it suits a maintenance window.
+        """
+        if self.sqlite_pragmas is None:
+            return
+
+        # Outside of a transaction, which a checkpoint cannot run inside
+        connection = self.engine.raw_connection()
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA optimize")
+            cursor.execute(f"PRAGMA wal_checkpoint({checkpoint})")
+            cursor.close()
+        finally:
+            connection.close()
+
+    def dispose(self):
+        """Forget pooled connections inherited from a parent process, without closing them."""
+        if getattr(self, "engine", None) is not None:
+            self.engine.dispose(close=False)
+
 
 db = Database()
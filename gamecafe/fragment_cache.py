@@ -0,0 +1,86 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from flask import Flask
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+FRAGMENT_CACHE_SIZE_KEY = "FRAGMENT_CACHE_SIZE"
+
+
+class FragmentCache:
+    """Bounded, per-process LRU of rendered template fragments."""
+
+    def __init__(self, app: Flask | None = None) -> None:
+        self.max_size = 2048
+        self._lock = Lock()
+        self._fragments: OrderedDict[tuple, Markup] = OrderedDict()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.max_size = app.config.get(FRAGMENT_CACHE_SIZE_KEY, self.max_size)
+
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.extend(fragment_cache=self)
+
+    def get_or_render(self, key: tuple, render) -> Markup:
+        with self._lock:
+            if (fragment := self._fragments.get(key)) is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+
+        fragment = Markup(render())
+
+        with self._lock:
+            self._fragments[key] = fragment
+
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """`{% cache "name", key, ... %}...{% endcache %}` renders its body once per key.
+
+    The key is extended with a digest of the enclosing template's source, so editing a template
+    drops the fragments rendered from its old version.
+    """
+
+    tags = {"cache"}
+
+    def _template_version(self, name: str | None) -> str:
+        if name is None or self.environment.loader is None:
+            return ""
+
+        source, _, _ = self.environment.loader.get_source(self.environment, name)
+
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        key = [nodes.Const(self._template_version(parser.name)), parser.parse_expression()]
+
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+
+        call = self.call_method("_render", [nodes.List(key)])
+
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        return self.environment.fragment_cache.get_or_render(tuple(key), caller)
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,77 @@
+"""Maintenance of the content-addressed image store (see `Storage.save_content`)."""
+
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+from .models import Game, db
+from .storage import is_content_key, portable_key, storage
+
+BATCH_SIZE = 1000
+
+
+def referenced_keys() -> set[str]:
+    stmt = (
+        select(Game.image_path)
+        .where(Game.image_path.is_not(None))
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+
+    return {portable_key(key) for key in db.session.scalars(stmt)}
+
+
+def collect_garbage(grace: timedelta, dry_run: bool = False, progress=print) -> int:
+    """Delete stored images no game points at, returning how many were (or would be) removed.
+
+    Files younger than `grace` are kept, as an import may have stored an image for a game it has
+    not committed yet.
+    """
+    referenced = referenced_keys()
+    older_than = datetime.now(timezone.utc) - grace
+    removed = 0
+
+    # Listed up front, so deleting does not disturb the backend's iteration
+    for key in list(storage.keys(older_than=older_than)):
+        if key in referenced:
+            continue
+
+        if not dry_run:
+            storage.delete(key)
+
+        removed += 1
+        progress(f"{'Would remove' if dry_run else 'Removed'} {key}")
+
+    db.session.rollback()
+
+    return removed
+
+
+def migrate_legacy_keys(progress=print) -> int:
+    """Re-store images saved under uuid (or absolute path) keys by content, deduplicating them.
+
+    The old files stay in place until `collect_garbage` finds them unreferenced.
+    """
+    rows = db.session.execute(select(Game.id, Game.image_path).where(Game.image_path.is_not(None)))
+    legacy = [(game_id, key) for game_id, key in rows if not is_content_key(key)]
+
+    migrated = 0
+
+    for i, (game_id, key) in enumerate(legacy):
+        if not storage.exists(key):
+            progress(f"Skipping game {game_id}, {key} is missing")
+            continue
+
+        with closing(storage.open(key)) as image:
+            new_key = storage.save_content(image)
+
+        db.session.execute(update(Game).where(Game.id == game_id).values(image_path=new_key))
+        migrated += 1
+
+        if (i + 1) % 100 == 0:
+            db.session.commit()
+            progress(f"Migrated {i + 1}/{len(legacy)} images")
+
+    db.session.commit()
+
+    return migrated
@@ -0,0 +1,241 @@
+"""A job queue on the application database, so BGG imports can run outside web requests.
+
+Workers (`flask run-worker`) claim the oldest runnable job with a guarded UPDATE, using
+`FOR UPDATE SKIP LOCKED` on PostgreSQL so concurrent workers never wait on each other. A running
+job heartbeats from a background thread for as long as its worker runs it; one whose heartbeat is
+older than `JOB_LEASE_SECONDS` is assumed to belong to a dead worker and is queued again. Failures
+are retried with exponential backoff until `max_attempts` is used up.
+"""
+
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from inspect import signature
+from threading import Event, Thread
+from typing import Callable
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import tasks
+from .models import Job, db
+
+TASKS: dict[str, Callable] = {
+    "import-collection": tasks.import_collection,
+    "update-games": tasks.update_games,
+}
+
+JOB_LEASE_SECONDS_KEY = "JOB_LEASE_SECONDS"
+
+RETRY_BACKOFF_SECONDS = 30
+PROGRESS_INTERVAL_SECONDS = 1
+
+
+class JobError(Exception):
+    pass
+
+
+def enqueue(task: str, arguments: dict | None = None, max_attempts: int = 3) -> Job:
+    arguments = arguments or {}
+
+    if (fn := TASKS.get(task)) is None:
+        raise JobError(f"Unknown task {task}")
+
+    if "progress" in arguments:
+        raise JobError("The progress argument is supplied by the worker")
+
+    try:
+        signature(fn).bind(**arguments, progress=None)
+    except TypeError as e:
+        raise JobError(f"Invalid arguments for {task}: {e}")
+
+    return Job(task, arguments, max_attempts).save()
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _lease() -> timedelta:
+    return timedelta(seconds=current_app.config.get(JOB_LEASE_SECONDS_KEY, 300))
+
+
+def requeue_abandoned() -> int:
+    """Queue running jobs whose worker stopped heartbeating; the lost attempt still counts."""
+    abandoned = (Job.status == Job.Status.RUNNING, Job.heartbeat < datetime.now() - _lease())
+    outcomes = (
+        (Job.attempts < Job.max_attempts, Job.Status.QUEUED),
+        (Job.attempts >= Job.max_attempts, Job.Status.FAILED),
+    )
+    count = 0
+
+    for attempts_left, status in outcomes:
+        stmt = (
+            update(Job)
+            .where(*abandoned, attempts_left)
+            .values(status=status, locked_by=None, error="Worker lost")
+            .execution_options(synchronize_session=False)
+        )
+        count += db.session.execute(stmt).rowcount
+
+    db.session.commit()
+
+    return count
+
+
+def claim(worker: str) -> Job | None:
+    now = datetime.now()
+
+    candidate = (
+        select(Job.id)
+        .where(Job.status == Job.Status.QUEUED, Job.run_after <= now)
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+    if (job_id := db.session.scalar(candidate)) is None:
+        db.session.rollback()
+        return None
+
+    # Without row locks (SQLite) another worker may have won the race since the SELECT
+    stmt = (
+        update(Job)
+        .where(Job.id == job_id, Job.status == Job.Status.QUEUED)
+        .values(
+            status=Job.Status.RUNNING,
+            locked_by=worker,
+            heartbeat=now,
+            attempts=Job.attempts + 1,
+            progress=0,
+            total=None,
+            started=now,
+            finished=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimed = db.session.execute(stmt).rowcount == 1
+    db.session.commit()
+
+    return Job.get_by_id(job_id) if claimed else None
+
+
+def _write_progress(job_id: int, worker: str, **values):
+    """Update a job this worker still holds, on its own connection.
+
+    Tasks commit (or roll back) the shared session as they see fit, so progress and heartbeats are
+    written outside of it.
+    """
+    stmt = (
+        update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker)
+        .values(heartbeat=datetime.now(), **values)
+    )
+
+    with db.engine.begin() as connection:
+        connection.execute(stmt)
+
+
+class _Heartbeat(Thread):
+    """Keeps a running job's lease while the task waits on BGG or computes without reporting."""
+
+    def __init__(self, job_id: int, worker: str) -> None:
+        super().__init__(daemon=True)
+
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = _lease().total_seconds() / 3
+        self.logger = current_app.logger
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                _write_progress(self.job_id, self.worker)
+            except SQLAlchemyError:
+                # A later beat may still land within the lease
+                self.logger.exception("Heartbeat for job %s failed", self.job_id)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class _Reporter:
+    """The `progress` callback handed to a task."""
+
+    def __init__(self, job_id: int, worker: str) -> None:
+        self.job_id = job_id
+        self.worker = worker
+        self.last_write = 0.0
+
+    def __call__(self, done: int, total: int | None, message: str):
+        now = time.monotonic()
+
+        if now - self.last_write < PROGRESS_INTERVAL_SECONDS and done != total:
+            return
+
+        self.last_write = now
+
+        _write_progress(self.job_id, self.worker, progress=done, total=total, message=message)
+
+
+def _finish(job_id: int, worker: str, error: str | None):
+    job = db.session.get(Job, job_id)
+
+    if job is None or job.locked_by != worker:
+        return
+
+    job.finished = datetime.now()
+    job.locked_by = None
+    job.error = error
+
+    if error is None:
+        job.status = Job.Status.SUCCEEDED
+    elif job.attempts < job.max_attempts:
+        job.status = Job.Status.QUEUED
+        job.run_after = job.finished + timedelta(
+            seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        )
+    else:
+        job.status = Job.Status.FAILED
+
+    db.session.commit()
+
+
+def run(job: Job, worker: str):
+    job_id = job.id
+    error = None
+
+    heartbeat = _Heartbeat(job_id, worker)
+    heartbeat.start()
+
+    try:
+        TASKS[job.task](**job.arguments, progress=_Reporter(job_id, worker))
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Job %s (%s) failed", job_id, job.task)
+
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        heartbeat.stop()
+
+    _finish(job_id, worker, error)
+
+
+def work(worker: str | None = None, poll_seconds: float = 5, once: bool = False):
+    """Run jobs until interrupted, or with `once` until the queue has nothing runnable."""
+    worker = worker or worker_name()
+
+    while True:
+        requeue_abandoned()
+
+        if (job := claim(worker)) is not None:
+            current_app.logger.info("%s running job %s (%s)", worker, job.id, job.task)
+            run(job, worker)
+        elif once:
+            return
+        else:
+            time.sleep(poll_seconds)
@@ -0,0 +1,411 @@
+"""Load-test an instance with a weighted mix of visitor traffic, reporting each route separately.
+
+    python -m gamecafe.loadtest --seed 2000 --start --users 50 --duration 60
+    python -m gamecafe.loadtest --url http://127.0.0.1:8000 --mix home=1,games=4,login=0
+
+Targets (game, collection and image ids, autocomplete prefixes) are read from the configured
+database, so it must be the one the instance serves. `--seed` first adds synthetic games with
+images, collections and a `loadtest` user to it. `--start` runs gunicorn with `gunicorn.conf.py`
+on the `--url` port for the duration of the test. Worker settings are taken from the usual
+environment variables, which makes comparing them a matter of re-running with different values.
+Each virtual user loops over scenarios picked by weight, waiting `--think` seconds between them.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from threading import Thread
+from urllib.parse import urlencode, urlsplit
+
+from sqlalchemy import func, select
+
+from . import create_app
+from .models import Collection, Game, User, db
+from .storage import storage
+
+LOADTEST_USERNAME = "loadtest"
+LOADTEST_PASSWORD = "loadtest-password"
+
+# Above the id range BGG hands out, so seeded games never collide with imported ones
+SEED_BGG_ID = 10_000_000
+SEED_COLLECTION_SIZE = 40
+SEED_IMAGE_VARIANTS = 50
+
+GAMES_PER_PAGE = 12
+TARGET_SAMPLE = 500
+
+WORDS = (
+    "Ancient Arcane Azure Brass Castle Clockwork Crimson Dragon Empire Forest Frontier Galaxy "
+    "Harbor Iron Jungle Kingdom Legend Lost Merchant Mystic Ocean Quest Realm River Rogue Ruins "
+    "Shadow Silver Spice Star Stone Storm Summit Temple Tower Trade Valley Village Voyage Wild"
+).split()
+
+DEFAULT_MIX = "home=2,games=4,collection=2,autocomplete=2,image=6,login=1"
+
+
+def _name(rng: random.Random) -> str:
+    return " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+
+
+def _image(variant: int) -> bytes:
+    # Around the size of a BGG thumbnail, distinct per variant so deduplication keeps them apart
+    return variant.to_bytes(4, "big") * 4096
+
+
+def seed(game_count: int, collection_count: int, progress=print):
+    """Add synthetic games, collections and the load-test user, unless a previous run did."""
+    if Game.get_by_bgg_id(SEED_BGG_ID) is not None:
+        progress("Seed data already present")
+        return
+
+    rng = random.Random(0)
+    images = [
+        storage.save_content(io.BytesIO(_image(variant)), "image/jpeg")
+        for variant in range(SEED_IMAGE_VARIANTS)
+    ]
+    games = []
+
+    for i in range(game_count):
+        game = Game(SEED_BGG_ID + i, f"{_name(rng)} {i}", images[i % len(images)])
+        game.min_players = rng.randint(1, 3)
+        game.max_players = game.min_players + rng.randint(0, 5)
+        game.playing_time = rng.choice((15, 30, 45, 60, 90, 120, 180))
+        game.weight = round(rng.uniform(1, 5), 2)
+        game.year_published = rng.randint(1980, 2025)
+
+        db.session.add(game)
+        games.append(game)
+
+    for i in range(collection_count):
+        collection = Collection(f"Load test {i}", "Seeded by gamecafe.loadtest")
+        collection.games = rng.sample(games, min(SEED_COLLECTION_SIZE, len(games)))
+        db.session.add(collection)
+
+    if User.get_by_username(LOADTEST_USERNAME) is None:
+        db.session.add(User("loadtest@example.com", LOADTEST_USERNAME, LOADTEST_PASSWORD))
+
+    db.session.commit()
+    progress(f"Seeded {game_count} games and {collection_count} collections")
+
+
+@dataclass
+class Targets:
+    pages: int
+    collection_ids: list[int]
+    image_ids: list[int]
+    names: list[str]
+
+
+def _sample(stmt) -> list:
+    return list(db.session.scalars(stmt.order_by(func.random()).limit(TARGET_SAMPLE)))
+
+
+def load_targets() -> Targets:
+    pages = max((Game.count() + GAMES_PER_PAGE - 1) // GAMES_PER_PAGE, 1)
+
+    return Targets(
+        pages=pages,
+        collection_ids=_sample(select(Collection.id)),
+        image_ids=_sample(select(Game.bgg_id).where(Game.image_path.is_not(None))),
+        names=_sample(select(Game.name)),
+    )
+
+
+# A scenario returns the requests one visitor action makes, as (route, method, path, form)
+def home(targets: Targets, rng: random.Random):
+    return [("/", "GET", "/", None)]
+
+
+def games(targets: Targets, rng: random.Random):
+    return [("/games", "GET", f"/games?p={rng.randint(1, targets.pages)}", None)]
+
+
+def collection(targets: Targets, rng: random.Random):
+    if not targets.collection_ids:
+        return []
+
+    collection_id = rng.choice(targets.collection_ids)
+
+    return [("/collections/<id>", "GET", f"/collections/{collection_id}", None)]
+
+
+def autocomplete(targets: Targets, rng: random.Random):
+    """One request per keystroke while a visitor types part of a game's name."""
+    if not targets.names:
+        return []
+
+    name = rng.choice(targets.names)
+    typed = name[: rng.randint(min(3, len(name)), len(name))]
+
+    return [
+        (
+            "/api/games/autocomplete",
+            "GET",
+            f"/api/games/autocomplete?{urlencode({'q': prefix})}",
+            None,
+        )
+        for prefix in (typed[:end] for end in range(1, len(typed) + 1))
+    ]
+
+
+def image(targets: Targets, rng: random.Random):
+    if not targets.image_ids:
+        return []
+
+    return [("/games/<id>/image", "GET", f"/games/{rng.choice(targets.image_ids)}/image", None)]
+
+
+def login(targets: Targets, rng: random.Random):
+    form = {"username": LOADTEST_USERNAME, "password": LOADTEST_PASSWORD}
+
+    return [("/login", "POST", "/login", form)]
+
+
+SCENARIOS = {
+    "home": home,
+    "games": games,
+    "collection": collection,
+    "autocomplete": autocomplete,
+    "image": image,
+    "login": login,
+}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name}, expected one of {', '.join(SCENARIOS)}")
+
+        weights[name] = float(weight or 1)
+
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def record(self, route: str, seconds: float, ok: bool):
+        self.latencies.setdefault(route, []).append(seconds)
+
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def merge(self, other: "Results"):
+        for route, latencies in other.latencies.items():
+            self.latencies.setdefault(route, []).extend(latencies)
+
+        for route, count in other.errors.items():
+            self.errors[route] = self.errors.get(route, 0) + count
+
+
+class VirtualUser(Thread):
+    def __init__(self, url, targets: Targets, weights: dict, deadline: float, think: float, seed):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.targets = targets
+        self.weights = weights
+        self.deadline = deadline
+        self.think = think
+        self.rng = random.Random(seed)
+        self.results = Results()
+
+    def connect(self) -> http.client.HTTPConnection:
+        connection_class = (
+            http.client.HTTPSConnection
+            if self.url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+
+        return connection_class(self.url.hostname, self.url.port, timeout=30)
+
+    def request(self, connection, method: str, path: str, form: dict | None) -> bool:
+        body = headers = None
+
+        if form is not None:
+            body = urlencode(form)
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+
+        # Redirects are expected (image storage, successful logins), so they are not followed
+        return response.status < 400
+
+    def run(self):
+        connection = self.connect()
+        names, weights = list(self.weights), list(self.weights.values())
+
+        while time.monotonic() < self.deadline:
+            scenario = SCENARIOS[self.rng.choices(names, weights)[0]]
+
+            for route, method, path, form in scenario(self.targets, self.rng):
+                start = time.perf_counter()
+
+                try:
+                    ok = self.request(connection, method, path, form)
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                    connection.close()
+                    connection = self.connect()
+
+                self.results.record(route, time.perf_counter() - start, ok)
+
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+
+        connection.close()
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(results: Results, elapsed: float) -> list[dict]:
+    routes = []
+    everything = []
+
+    for route, latencies in sorted(results.latencies.items()):
+        everything.extend(latencies)
+        routes.append(_summary(route, latencies, results.errors.get(route, 0), elapsed))
+
+    if everything:
+        routes.append(_summary("total", everything, sum(results.errors.values()), elapsed))
+
+    return routes
+
+
+def _summary(route: str, latencies: list[float], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+
+    return {
+        "route": route,
+        "requests": len(ordered),
+        "rps": len(ordered) / elapsed,
+        "error_rate": errors / len(ordered),
+        "p50_ms": percentile(ordered, 0.5) * 1000,
+        "p90_ms": percentile(ordered, 0.9) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def print_report(routes: list[dict]):
+    print(
+        f"{'route':<26}{'requests':>9}{'req/s':>9}{'errors':>8}"
+        f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    )
+
+    for r in routes:
+        print(
+            f"{r['route']:<26}{r['requests']:>9}{r['rps']:>9.1f}{r['error_rate']:>8.1%}"
+            f"{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+        )
+
+
+def start_server(url: str) -> subprocess.Popen:
+    address = urlsplit(url)
+    env = dict(os.environ, GUNICORN_BIND=f"{address.hostname}:{address.port}")
+    server = subprocess.Popen(["gunicorn", "--config", "gunicorn.conf.py"], env=env)
+
+    for _ in range(300):
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited before accepting connections")
+
+        try:
+            connection = http.client.HTTPConnection(address.hostname, address.port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            connection.close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+
+    server.terminate()
+    raise RuntimeError("gunicorn did not accept connections within 30 seconds")
+
+
+def run(url: str, targets: Targets, weights: dict, users: int, duration: float, think: float):
+    deadline = time.monotonic() + duration
+    threads = [VirtualUser(url, targets, weights, deadline, think, seed=i) for i in range(users)]
+    start = time.monotonic()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.monotonic() - start
+    results = Results()
+
+    for thread in threads:
+        results.merge(thread.results)
+
+    return summarize(results, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--think", type=float, default=0, help="mean seconds between actions")
+    parser.add_argument(
+        "--mix", default=DEFAULT_MIX, help=f"scenario weights, default {DEFAULT_MIX}"
+    )
+    parser.add_argument("--seed", type=int, metavar="GAMES", help="seed this many games first")
+    parser.add_argument("--collections", type=int, default=20, help="collections to seed")
+    parser.add_argument("--start", action="store_true", help="run gunicorn for the test")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    app = create_app()
+
+    with app.app_context():
+        if args.seed:
+            seed(args.seed, args.collections)
+
+        targets = load_targets()
+        db.session.rollback()
+
+    server = start_server(args.url) if args.start else None
+
+    try:
+        routes = run(args.url, targets, weights, args.users, args.duration, args.think)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        json.dump(routes, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(routes)
+
+    sys.exit(1 if not routes else 0)
+
+
+if __name__ == "__main__":
+    main()
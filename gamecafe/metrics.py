@@ -0,0 +1,326 @@
+"""Prometheus text-format metrics, aggregated across gunicorn worker processes.
+
+Every process counts in memory. With `METRICS_DIR` set, each one also writes its samples to
+`<pid>-<start>.json` in that directory at most once a second. When a worker exits, the gunicorn
+master folds its counters and histograms into `archive.json` and drops its gauges. `/metrics` sums
+every file, so totals survive worker recycling. Without `METRICS_DIR`, only the process serving
+the scrape is reported.
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Callable
+
+from flask import Flask, g, request
+
+METRICS_DIR_KEY = "METRICS_DIR"
+ARCHIVE_NAME = "archive.json"
+FLUSH_INTERVAL_SECONDS = 1
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _write_atomically(path: Path, text: str):
+    """Replace `path` with `text` through a uniquely named temporary file in the same directory."""
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False) as file:
+        file.write(text)
+
+    try:
+        os.replace(file.name, path)
+    except OSError:
+        os.unlink(file.name)
+        raise
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class Metric:
+    TYPE: str = None
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, object] = {}
+
+        metrics.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def merge(self, current, value):
+        return current + value
+
+    def label_text(self, key: tuple, **extra) -> str:
+        pairs = [*zip(self.labels, key), *extra.items()]
+
+        if not pairs:
+            return ""
+
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self, values: dict) -> list[str]:
+        return [f"{self.name}{self.label_text(key)} {value}" for key, value in values.items()]
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+
+        with metrics.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A per-process value, summed over the live processes."""
+
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels):
+        with metrics.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+
+        with metrics.lock:
+            # One count per bucket plus +Inf, then the sum
+            if (counts := self.values.get(key)) is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def merge(self, current, value):
+        return [a + b for a, b in zip(current, value)]
+
+    def render(self, values: dict) -> list[str]:
+        lines = []
+
+        for key, counts in values.items():
+            cumulative = 0
+
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{self.label_text(key, le=str(bound))} {cumulative}"
+                )
+
+            lines.append(f"{self.name}_sum{self.label_text(key)} {counts[-1]}")
+            lines.append(f"{self.name}_count{self.label_text(key)} {cumulative}")
+
+        return lines
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable] = []
+
+        self.directory: Path | None = None
+        self.last_flush = 0.0
+        self.started = int(time.time())
+        self.flusher_pid = None
+        self.logger = None
+
+    def register(self, metric: Metric):
+        self.metrics[metric.name] = metric
+
+    def on_collect(self, collector: Callable):
+        """Call `collector` to refresh gauges before samples are written or rendered."""
+        self.collectors.append(collector)
+
+    def init_app(self, app: Flask):
+        if directory := app.config.get(METRICS_DIR_KEY):
+            self.directory = Path(directory)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            atexit.register(self.flush)
+
+        self.logger = app.logger
+
+        @app.before_request
+        def start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response):
+            if (start := g.pop("metrics_start", None)) is not None:
+                labels = dict(view=request.endpoint or "unmatched", method=request.method)
+
+                request_duration.observe(time.perf_counter() - start, **labels)
+
+                if (size := response.calculate_content_length()) is not None:
+                    response_size.observe(size, **labels)
+
+            self.maybe_flush()
+
+            return response
+
+    def clear(self):
+        """Drop every sample, such as those a forked worker inherits from the gunicorn master."""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+    def _snapshot(self) -> dict:
+        for collector in self.collectors:
+            collector()
+
+        with self.lock:
+            return {
+                name: {json.dumps(key): value for key, value in metric.values.items()}
+                for name, metric in self.metrics.items()
+                if metric.values
+            }
+
+    def _path(self) -> Path:
+        return self.directory / f"{os.getpid()}-{self.started}.json"
+
+    def flush(self):
+        if self.directory is None:
+            return
+
+        # Serialized, so an older snapshot never replaces a newer one
+        with self.flush_lock:
+            _write_atomically(self._path(), json.dumps(self._snapshot()))
+            self.last_flush = time.monotonic()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception("Writing metrics failed, retrying later")
+
+    def maybe_flush(self):
+        if self.directory is None:
+            return
+
+        # Threads do not survive a fork, so every worker starts its own flusher on first use; it
+        # covers the samples recorded after a process's last request
+        with self.lock:
+            if self.flusher_pid != os.getpid():
+                self.flusher_pid = os.getpid()
+                Thread(target=self._flush_periodically, daemon=True).start()
+
+        if time.monotonic() - self.last_flush > FLUSH_INTERVAL_SECONDS:
+            try:
+                self.flush()
+            except OSError:
+                # Metrics must not fail the request; the flusher thread tries again
+                self.logger.exception("Writing metrics failed, retrying later")
+
+    def _merge(self, totals: dict, samples: dict, gauges: bool = True):
+        for name, values in samples.items():
+            if (metric := self.metrics.get(name)) is None or (
+                metric.TYPE == "gauge" and not gauges
+            ):
+                continue
+
+            merged = totals.setdefault(name, {})
+
+            for key, value in values.items():
+                merged[key] = value if key not in merged else metric.merge(merged[key], value)
+
+    def collect(self) -> dict:
+        if self.directory is None:
+            return self._snapshot()
+
+        self.flush()
+
+        totals = {}
+
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                samples = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+
+            self._merge(totals, samples)
+
+        return totals
+
+    def render(self) -> str:
+        lines = []
+
+        for name, values in sorted(self.collect().items()):
+            metric = self.metrics[name]
+            values = {tuple(json.loads(key)): value for key, value in values.items()}
+
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.TYPE}")
+            lines.extend(metric.render(values))
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self, directory: str | Path):
+        """Start from zero, dropping every file left by a previous run."""
+        for path in Path(directory).glob("*.json"):
+            path.unlink()
+
+    def mark_process_dead(self, pid: int, directory: str | Path):
+        """Fold an exited worker's counters into the archive; only the gunicorn master calls it."""
+        directory = Path(directory)
+        archive = directory / ARCHIVE_NAME
+
+        for path in directory.glob(f"{pid}-*.json"):
+            try:
+                totals = json.loads(archive.read_text())
+            except (OSError, ValueError):
+                totals = {}
+
+            self._merge(totals, json.loads(path.read_text()), gauges=False)
+
+            _write_atomically(archive, json.dumps(totals))
+
+            path.unlink()
+
+
+metrics = Metrics()
+
+request_duration = Histogram(
+    "gamecafe_request_duration_seconds", "Request latency by view", ("view", "method")
+)
+response_size = Histogram(
+    "gamecafe_response_size_bytes", "Response body size by view", ("view", "method"), SIZE_BUCKETS
+)
+
+db_queries = Counter("gamecafe_db_queries_total", "SQL statements executed")
+db_query_seconds = Counter("gamecafe_db_query_seconds_total", "Time spent executing SQL")
+db_pool_checked_out = Gauge("gamecafe_db_pool_checked_out", "Connections in use")
+db_pool_size = Gauge("gamecafe_db_pool_size", "Connections held by the pool")
+
+bgg_requests = Counter("gamecafe_bgg_requests_total", "BGG API requests", ("endpoint",))
+bgg_retries = Counter("gamecafe_bgg_retries_total", "BGG API requests repeated", ("endpoint",))
+bgg_cache_hits = Counter(
+    "gamecafe_bgg_cache_hits_total", "BGG API responses served from cache", ("endpoint",)
+)
+bgg_throttled = Counter(
+    "gamecafe_bgg_throttled_total", "BGG API responses asking to back off", ("endpoint",)
+)
+
+image_bytes = Counter("gamecafe_image_bytes_total", "Image bytes served by the app")
+image_redirects = Counter("gamecafe_image_redirects_total", "Image requests sent to storage")
@@ -0,0 +1,34 @@
+"""Upgrade the database to the latest revision, skipping Alembic's environment when already there.
+
+Run as `python -m gamecafe.migrate` from the directory holding `alembic.ini`.
+"""
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, pool
+
+from .config import Config as AppConfig
+
+
+def current_heads(database_uri: str) -> set[str]:
+    engine = create_engine(database_uri, poolclass=pool.NullPool)
+
+    with engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def main(config_path: str = "alembic.ini"):
+    config = Config(config_path)
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+
+    if current_heads(AppConfig.SQLALCHEMY_DATABASE_URI) == heads:
+        print("Database already at head")
+        return
+
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    main()
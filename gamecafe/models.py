@@ -1,5 +1,6 @@
+from collections import defaultdict
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from enum import Enum, IntEnum
 from hashlib import pbkdf2_hmac
 from math import ceil
@@ -7,16 +8,19 @@ from os import urandom
 from typing import Optional, Self
 
 from sqlalchemy import (
+    JSON,
     Column,
     ForeignKey,
     Index,
     Table,
     UniqueConstraint,
+    event,
     func,
+    inspect,
     select,
     update,
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 
 from .database import db
 
@@ -61,15 +65,26 @@ class IdModel(db.Base):
         return res[0]
 
     @classmethod
-    def paginate(cls, page: int, per_page: int, stmt=None) -> Page[Self]:
+    def paginate(
+        cls,
+        page: int,
+        per_page: int,
+        stmt=None,
+        item_count: int = None,
+        order_by: tuple = (),
+    ) -> Page[Self]:
+        """One page of `stmt`, in `order_by` order (by id by default)."""
         if stmt is None:
             stmt = cls.select()
 
-        stmt = stmt.order_by(cls.id).offset((page - 1) * per_page).limit(per_page)
+        if item_count is None:
+            count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+            item_count = db.session.scalar(count_stmt)
 
-        items = db.session.scalars(stmt).all()
+        stmt = stmt.order_by(*order_by or (cls.id,))
+        stmt = stmt.offset((page - 1) * per_page).limit(per_page)
 
-        item_count = cls.count()
+        items = db.session.scalars(stmt).all()
         page_count = ceil(item_count / per_page)
 
         return cls.Page(
@@ -122,6 +137,7 @@ publisher_game_table = Table(
     db.Base.metadata,
     Column("game_id", ForeignKey("games.id"), primary_key=True),
     Column("publisher_id", ForeignKey("publishers.id"), primary_key=True),
+    Index("publisher_game_publisher_idx", "publisher_id", "game_id"),
 )
 
 game_tag_table = Table(
@@ -129,6 +145,7 @@ game_tag_table = Table(
     db.Base.metadata,
     Column("game_id", ForeignKey("games.id"), primary_key=True),
     Column("tag_id", ForeignKey("tags.id"), primary_key=True),
+    Index("game_tag_tag_idx", "tag_id", "game_id"),
 )
 
 
@@ -139,6 +156,9 @@ class Publisher(BggItem):
     games: Mapped[list["Game"]] = relationship(
         secondary=publisher_game_table, back_populates="publishers"
     )
+    game_count: Mapped[int] = mapped_column(default=0, server_default="0")
+
+    __table_args__ = (Index("publisher_count_idx", "game_count", "id"),)
 
     def __init__(self, bgg_id: int, name: str):
         super().__init__(bgg_id)
@@ -146,7 +166,16 @@ class Publisher(BggItem):
         self.name = name
 
     def serialize(self):
-        return {"name": self.name, "games": [game.id for game in self.games]}
+        return {
+            "id": self.id,
+            "bgg_id": self.bgg_id,
+            "name": self.name,
+            "game_count": self.game_count,
+        }
+
+    @classmethod
+    def popular_first(cls) -> tuple:
+        return cls.game_count.desc(), cls.id.desc()
 
 
 class Tag(BggItem):
@@ -166,8 +195,13 @@ class Tag(BggItem):
     type: Mapped[Type]
 
     games: Mapped[list["Game"]] = relationship(secondary=game_tag_table, back_populates="tags")
+    game_count: Mapped[int] = mapped_column(default=0, server_default="0")
 
     UniqueConstraint("bgg_id", "type", name="uq_bgg_id_type")
+    __table_args__ = (
+        Index("tag_type_count_idx", "type", "game_count"),
+        Index("tag_count_idx", "game_count", "id"),
+    )
 
     def __init__(self, bgg_id, name: str, type: Type):
         super().__init__(bgg_id)
@@ -175,18 +209,58 @@ class Tag(BggItem):
         self.name = name
         self.type = type
 
+    def serialize(self):
+        return {
+            "id": self.id,
+            "bgg_id": self.bgg_id,
+            "name": self.name,
+            "type": self.type,
+            "game_count": self.game_count,
+        }
+
+    @classmethod
+    def popular_first(cls) -> tuple:
+        return cls.game_count.desc(), cls.id.desc()
+
 
 class Game(BggItem):
     __tablename__ = "games"
 
+    @dataclass
+    class Facet:
+        id: int
+        name: str
+        count: int
+
+        def serialize(self):
+            return {"id": self.id, "name": self.name, "count": self.count}
+
     name: Mapped[str]
     publishers: Mapped[list[Publisher]] = relationship(
         secondary=publisher_game_table, back_populates="games"
     )
     image_path: Mapped[Optional[str]]
+    image_url: Mapped[Optional[str]] = mapped_column(index=True)
     location: Mapped[Optional[str]]
-
-    last_updated: Mapped[datetime] = mapped_column(server_default=func.now())
+    # When the game was last found missing from the imported BGG collection
+    left_collection: Mapped[Optional[datetime]]
+
+    min_players: Mapped[Optional[int]]
+    max_players: Mapped[Optional[int]]
+    playing_time: Mapped[Optional[int]]
+    weight: Mapped[Optional[float]]
+    year_published: Mapped[Optional[int]]
+
+    # When the game was last synced from BGG, which the refresh scheduler goes by
+    last_updated: Mapped[datetime] = mapped_column(
+        default=datetime.now, server_default=func.now(), index=True
+    )
+    # Moves on every change to the game, keying rendered fragments and API ETags
+    modified: Mapped[datetime] = mapped_column(
+        default=datetime.now, server_default=func.now(), index=True
+    )
+    # Maintained by `gamecafe.popularity` from the daily `GameViewCount` buckets
+    weekly_views: Mapped[int] = mapped_column(default=0, server_default="0")
     tags: Mapped[list[Tag]] = relationship(secondary=game_tag_table, back_populates="games")
 
     reports: Mapped[list["Report"]] = relationship(back_populates="game")
@@ -195,6 +269,13 @@ class Game(BggItem):
         secondary="collection_games", back_populates="games"
     )
 
+    __table_args__ = (
+        Index("game_players_time_idx", "min_players", "max_players", "playing_time"),
+        Index("game_time_weight_idx", "playing_time", "weight"),
+        Index("game_year_idx", "year_published"),
+        Index("game_weekly_views_idx", "weekly_views", "id"),
+    )
+
     def __init__(self, bgg_id: int, name: str, image_path: str | None):
         super().__init__(bgg_id)
 
@@ -207,10 +288,153 @@ class Game(BggItem):
             "bgg_id": self.bgg_id,
             "name": self.name,
             "location": self.location,
+            "min_players": self.min_players,
+            "max_players": self.max_players,
+            "playing_time": self.playing_time,
+            "weight": self.weight,
+            "year_published": self.year_published,
+            "left_collection": self.left_collection and self.left_collection.isoformat(),
             "publishers": [publisher.id for publisher in self.publishers],
             "tags": [tag.id for tag in self.tags],
         }
 
+    @classmethod
+    def version(cls) -> tuple:
+        """Changes whenever a game is added, edited or removed; answered from indexes alone."""
+        stmt = select(func.count(cls.id), func.max(cls.id), func.max(cls.modified))
+
+        return tuple(db.session.execute(stmt).one())
+
+    @classmethod
+    def filter(
+        cls,
+        stmt=None,
+        tag_ids: list[int] = (),
+        tag_types: list[Tag.Type] = (),
+        publisher_ids: list[int] = (),
+        match_all: bool = True,
+        players: int | None = None,
+        min_time: int | None = None,
+        max_time: int | None = None,
+        min_weight: float | None = None,
+        max_weight: float | None = None,
+        min_year: int | None = None,
+        max_year: int | None = None,
+    ):
+        """Narrow `stmt` to games matching every (or, without `match_all`, any) given facet value.
+
+        Each facet is resolved against the `(tag_id, game_id)` / `(publisher_id, game_id)` indexes
+        and different facets are always combined with AND. The remaining arguments are inclusive
+        ranges over the indexed detail columns, `players` having to fit between the min and max.
+        """
+        if stmt is None:
+            stmt = cls.select()
+
+        if players is not None:
+            stmt = stmt.where(cls.min_players <= players, cls.max_players >= players)
+
+        ranges = (
+            (cls.playing_time, min_time, max_time),
+            (cls.weight, min_weight, max_weight),
+            (cls.year_published, min_year, max_year),
+        )
+
+        for column, low, high in ranges:
+            if low is not None:
+                stmt = stmt.where(column >= low)
+
+            if high is not None:
+                stmt = stmt.where(column <= high)
+
+        def matching(game_id, value, values):
+            sub = select(game_id).where(value.in_(values)).group_by(game_id)
+
+            if match_all:
+                sub = sub.having(func.count(value.distinct()) == len(set(values)))
+
+            return cls.id.in_(sub)
+
+        if tag_ids:
+            stmt = stmt.where(matching(game_tag_table.c.game_id, game_tag_table.c.tag_id, tag_ids))
+
+        if tag_types:
+            type_games = (
+                select(game_tag_table.c.game_id, Tag.type)
+                .join(Tag, Tag.id == game_tag_table.c.tag_id)
+                .subquery()
+            )
+            stmt = stmt.where(matching(type_games.c.game_id, type_games.c.type, tag_types))
+
+        if publisher_ids:
+            stmt = stmt.where(
+                matching(
+                    publisher_game_table.c.game_id,
+                    publisher_game_table.c.publisher_id,
+                    publisher_ids,
+                )
+            )
+
+        return stmt
+
+    @classmethod
+    def facets(cls, stmt=None, limit: int = 15) -> dict[str, list[Facet]]:
+        """Top tag (per `Tag.Type`) and publisher counts for the games selected by `stmt`.
+
+        Without `stmt` the maintained `game_count` columns are read directly; with one, only the
+        association rows of the matching games are grouped.
+        """
+        game_ids = None if stmt is None else stmt.with_only_columns(cls.id).order_by(None)
+
+        def top(model, association, key, *where):
+            if game_ids is None:
+                count = model.game_count
+                query = select(model.id, model.name, count).where(count > 0, *where)
+            else:
+                count = func.count(association.c.game_id)
+                query = (
+                    select(model.id, model.name, count)
+                    .join(association, key == model.id)
+                    .where(association.c.game_id.in_(game_ids), *where)
+                    .group_by(model.id, model.name)
+                )
+
+            query = query.order_by(count.desc(), model.id).limit(limit)
+
+            return [cls.Facet(*row) for row in db.session.execute(query)]
+
+        facets = {
+            tag_type.value: top(Tag, game_tag_table, game_tag_table.c.tag_id, Tag.type == tag_type)
+            for tag_type in Tag.Type
+        }
+        facets["publisher"] = top(
+            Publisher, publisher_game_table, publisher_game_table.c.publisher_id
+        )
+
+        return facets
+
+    def similar_games(self, limit: int = 8) -> list["Game"]:
+        """Neighbours precomputed by `gamecafe.similarity`, best match first."""
+        stmt = (
+            Game.select()
+            .join(GameSimilarity, GameSimilarity.similar_game_id == Game.id)
+            .where(GameSimilarity.game_id == self.id)
+            .order_by(GameSimilarity.score.desc())
+            .limit(limit)
+        )
+
+        return db.session.scalars(stmt).all()
+
+    @classmethod
+    def popular_first(cls) -> tuple:
+        return cls.weekly_views.desc(), cls.id.desc()
+
+    @classmethod
+    def popular(cls, limit: int = 8) -> list["Game"]:
+        """The most viewed games of the past week."""
+        stmt = cls.select().where(cls.weekly_views > 0).order_by(*cls.popular_first()).limit(limit)
+
+        return db.session.scalars(stmt).all()
+
 
 class Collection(IdModel):
     __tablename__ = "collections"
@@ -221,6 +445,8 @@ class Collection(IdModel):
     )
     description: Mapped[Optional[str]]
     highlighted: Mapped[bool] = mapped_column(server_default="false")
+    game_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    last_viewed: Mapped[Optional[datetime]] = mapped_column(index=True)
 
     def __init__(self, name: str, description: Optional[str] = None):
         self.name = name
@@ -236,18 +462,67 @@ class Collection(IdModel):
 
         return db.session.scalar(stmt)
 
+    def mark_viewed(self, resolution: timedelta = timedelta(hours=1)):
+        """Record a view, writing at most once per `resolution` so page views stay read-only."""
+        now = datetime.now()
+
+        if self.last_viewed is not None and now - self.last_viewed < resolution:
+            return
+
+        stmt = update(Collection).where(Collection.id == self.id).values(last_viewed=now)
+        db.session.execute(stmt, execution_options={"synchronize_session": False})
+        db.session.commit()
+
+    def games_page(self, page: int, per_page: int) -> IdModel.Page[Game]:
+        stmt = (
+            Game.select()
+            .join(CollectionGame, CollectionGame.game_id == Game.id)
+            .where(CollectionGame.collection_id == self.id)
+        )
+
+        return Game.paginate(page, per_page, stmt=stmt, item_count=self.game_count)
+
 
 class CollectionGame(db.Base):
     __tablename__ = "collection_games"
+    __table_args__ = (Index("collection_games_collection_idx", "collection_id", "game_id"),)
 
     game_id: Mapped[int] = mapped_column(ForeignKey("games.id"), primary_key=True)
     collection_id: Mapped[int] = mapped_column(ForeignKey("collections.id"), primary_key=True)
 
 
+class GameSimilarity(db.Base):
+    __tablename__ = "game_similarities"
+    __table_args__ = (
+        Index("game_similarity_score_idx", "game_id", "score"),
+        Index("game_similarity_similar_idx", "similar_game_id", "game_id"),
+    )
+
+    game_id: Mapped[int] = mapped_column(
+        ForeignKey("games.id", ondelete="CASCADE"), primary_key=True
+    )
+    similar_game_id: Mapped[int] = mapped_column(
+        ForeignKey("games.id", ondelete="CASCADE"), primary_key=True
+    )
+    score: Mapped[float]
+
+
+class GameViewCount(db.Base):
+    """Views of a game on one day, written in batches by `gamecafe.popularity`."""
+
+    __tablename__ = "game_view_counts"
+
+    game_id: Mapped[int] = mapped_column(
+        ForeignKey("games.id", ondelete="CASCADE"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(primary_key=True)
+    views: Mapped[int]
+
+
 class Report(IdModel):
     __tablename__ = "reports"
 
-    game_id: Mapped[Optional[int]] = mapped_column(ForeignKey("games.id"))
+    game_id: Mapped[Optional[int]] = mapped_column(ForeignKey("games.id"), index=True)
     game: Mapped["Game"] = relationship(back_populates="reports")
 
     game_name: Mapped[str]
@@ -257,6 +532,14 @@ class Report(IdModel):
         self.game_name = game_name
         self.description = description
 
+    def serialize(self):
+        return {
+            "id": self.id,
+            "game_id": self.game_id,
+            "game_name": self.game_name,
+            "description": self.description,
+        }
+
 
 class User(IdModel):
     class Role(IntEnum):
@@ -317,13 +600,13 @@ class User(IdModel):
 
     @classmethod
     def get_by_username(cls, username: str):
-        stmt = cls.select().where(cls.username == username.lower())
+        stmt = cls.select().where(func.lower(cls.username) == username.lower())
 
         return db.session.scalar(stmt)
 
     @classmethod
     def get_by_email(cls, email: str):
-        stmt = cls.select().where(cls.email == email.lower())
+        stmt = cls.select().where(func.lower(cls.email) == email.lower())
 
         return db.session.scalar(stmt)
 
@@ -339,5 +622,171 @@ class User(IdModel):
         }
 
 
+class Job(IdModel):
+    """A task queued for `flask run-worker`, see `gamecafe.jobs`."""
+
+    class Status(Enum):
+        QUEUED = "queued"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+        def __str__(self):
+            return self.value
+
+    __tablename__ = "jobs"
+    __table_args__ = (Index("job_status_run_after_idx", "status", "run_after"),)
+
+    task: Mapped[str]
+    arguments: Mapped[dict] = mapped_column(JSON, default=dict)
+
+    status: Mapped[Status] = mapped_column(default=Status.QUEUED)
+    attempts: Mapped[int] = mapped_column(default=0)
+    max_attempts: Mapped[int] = mapped_column(default=3)
+    run_after: Mapped[datetime] = mapped_column(default=datetime.now)
+
+    locked_by: Mapped[Optional[str]]
+    heartbeat: Mapped[Optional[datetime]]
+
+    progress: Mapped[int] = mapped_column(default=0)
+    total: Mapped[Optional[int]]
+    message: Mapped[Optional[str]]
+    error: Mapped[Optional[str]]
+
+    created: Mapped[datetime] = mapped_column(default=datetime.now)
+    started: Mapped[Optional[datetime]]
+    finished: Mapped[Optional[datetime]]
+
+    def __init__(self, task: str, arguments: dict, max_attempts: int = 3):
+        self.task = task
+        self.arguments = arguments
+        self.max_attempts = max_attempts
+
+    @property
+    def throughput(self) -> float | None:
+        """Items processed per second over the current attempt."""
+        if self.started is None or not self.progress:
+            return None
+
+        elapsed = ((self.finished or datetime.now()) - self.started).total_seconds()
+
+        return self.progress / elapsed if elapsed > 0 else None
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "task": self.task,
+            "arguments": self.arguments,
+            "status": str(self.status),
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "run_after": self.run_after.isoformat(),
+            "locked_by": self.locked_by,
+            "heartbeat": self.heartbeat and self.heartbeat.isoformat(),
+            "progress": self.progress,
+            "total": self.total,
+            "message": self.message,
+            "throughput": self.throughput,
+            "error": self.error,
+            "created": self.created.isoformat(),
+            "started": self.started and self.started.isoformat(),
+            "finished": self.finished and self.finished.isoformat(),
+        }
+
+
 user_username_index = Index("user_username_idx", func.lower(User.username), unique=True)
 user_email_index = Index("user_email_idx", func.lower(User.email), unique=True)
+collection_highlighted_index = Index(
+    "collection_highlighted_idx",
+    Collection.highlighted,
+    postgresql_where=Collection.highlighted == True,
+    sqlite_where=Collection.highlighted == True,
+)
+
+
+def _association_changes(session, obj, key):
+    if obj in session.deleted:
+        return [], list(getattr(obj, key))
+
+    history = inspect(obj).attrs[key].history
+
+    return history.added, history.deleted
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_game_count_changes(session, flush_context, instances):
+    deltas = session.info.setdefault("game_count_deltas", defaultdict(int))
+
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Game):
+            for key in ("tags", "publishers"):
+                added, removed = _association_changes(session, obj, key)
+
+                for item in added:
+                    deltas[item] += 1
+
+                for item in removed:
+                    deltas[item] -= 1
+
+            if obj in session.deleted:
+                for collection in obj.collections:
+                    deltas[collection] -= 1
+
+        elif isinstance(obj, Collection) and obj not in session.deleted:
+            added, removed = _association_changes(session, obj, "games")
+            deltas[obj] += len(added) - len(removed)
+
+
+@event.listens_for(Session, "before_flush")
+def _touch_modified_games(session, flush_context, instances):
+    # `modified` keys rendered fragments and API ETags, so any edit has to move it, including
+    # tag and publisher changes that never update the games row
+    for game in session.dirty:
+        if (
+            isinstance(game, Game)
+            and session.is_modified(game)
+            and not inspect(game).attrs.modified.history.has_changes()
+        ):
+            game.modified = datetime.now()
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _apply_game_count_changes(session, flush_context):
+    deltas = session.info.pop("game_count_deltas", None) or {}
+
+    for item, delta in deltas.items():
+        if delta == 0 or item.id is None or item in session.deleted:
+            continue
+
+        model = type(item)
+        stmt = (
+            update(model.__table__)
+            .where(model.id == item.id)
+            .values(game_count=model.game_count + delta)
+        )
+        session.connection().execute(stmt)
+        session.expire(item, ["game_count"])
+
+
+def _change_collection_game_count(connection, collection_id: int, delta: int):
+    stmt = (
+        update(Collection.__table__)
+        .where(Collection.id == collection_id)
+        .values(game_count=Collection.game_count + delta)
+    )
+    connection.execute(stmt)
+
+
+@event.listens_for(CollectionGame, "after_insert")
+def _collection_game_inserted(mapper, connection, target):
+    _change_collection_game_count(connection, target.collection_id, 1)
+
+
+@event.listens_for(CollectionGame, "after_delete")
+def _collection_game_deleted(mapper, connection, target):
+    _change_collection_game_count(connection, target.collection_id, -1)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_game_count_changes(session, previous_transaction):
+    session.info.pop("game_count_deltas", None)
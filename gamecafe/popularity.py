@@ -0,0 +1,130 @@
+"""Game view counting, coalesced in memory so page views do not write to the database.
+
+`view_counter.record` only bumps a per-process counter. Every `VIEW_FLUSH_SECONDS`, from a
+background thread outside any request, and when a gunicorn worker exits (see `gunicorn.conf.py`),
+the counts are added to the daily `GameViewCount` buckets in one transaction. That transaction also recomputes
+`Game.weekly_views` for the games involved, which `Game.popular_first` sorts by through its index.
+On its first flush of each day, a process also recomputes every game with weekly views, so days
+leaving the window are subtracted, and deletes buckets older than `HISTORY_DAYS`.
+"""
+
+import os
+import time
+from collections import Counter
+from datetime import date, timedelta
+from threading import Lock, Thread
+
+from flask import Flask
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from .database import db
+from .models import Game, GameViewCount
+
+VIEW_FLUSH_SECONDS_KEY = "VIEW_FLUSH_SECONDS"
+
+WINDOW = timedelta(days=7)
+HISTORY_DAYS = 90
+
+INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _weekly_views(today: date):
+    return (
+        select(func.coalesce(func.sum(GameViewCount.views), 0))
+        .where(GameViewCount.game_id == Game.id, GameViewCount.day > today - WINDOW)
+        .scalar_subquery()
+    )
+
+
+class ViewCounter:
+    def __init__(self, app: Flask | None = None) -> None:
+        self._lock = Lock()
+        self._counts: Counter[int] = Counter()
+
+        self.interval = 30
+        self.last_decay: date | None = None
+        self.flusher_pid = None
+        self.logger = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.interval = app.config.get(VIEW_FLUSH_SECONDS_KEY, self.interval)
+        self.logger = app.logger
+
+    def record(self, game_id: int):
+        with self._lock:
+            self._counts[game_id] += 1
+
+            # Threads do not survive a fork, so every worker starts its own flusher on its first
+            # view. Flushing from a request could wait on the write lock that request holds.
+            if self.flusher_pid != os.getpid():
+                self.flusher_pid = os.getpid()
+                Thread(target=self._flush_periodically, daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.interval)
+
+            try:
+                self.flush()
+            except Exception:
+                self.logger.exception("Flushing game views failed, retrying later")
+
+    def flush(self):
+        """Add the views counted since the last flush to today's buckets."""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+
+        today = date.today()
+
+        if not counts and self.last_decay == today:
+            return
+
+        try:
+            with db.engine.begin() as connection:
+                if counts:
+                    self._write(connection, counts, today)
+
+                if self.last_decay != today:
+                    self._decay(connection, today)
+        except SQLAlchemyError:
+            with self._lock:
+                self._counts.update(counts)
+
+            raise
+
+        self.last_decay = today
+
+    def _write(self, connection, counts: Counter, today: date):
+        # Views of games deleted since would violate the foreign key
+        existing = connection.scalars(select(Game.id).where(Game.id.in_(counts))).all()
+
+        if not existing:
+            return
+
+        insert = INSERTS[connection.dialect.name](GameViewCount)
+        stmt = insert.on_conflict_do_update(
+            index_elements=[GameViewCount.game_id, GameViewCount.day],
+            set_={"views": GameViewCount.views + insert.excluded.views},
+        )
+        connection.execute(
+            stmt, [dict(game_id=game_id, day=today, views=counts[game_id]) for game_id in existing]
+        )
+
+        stmt = update(Game).where(Game.id.in_(existing)).values(weekly_views=_weekly_views(today))
+        connection.execute(stmt)
+
+    def _decay(self, connection, today: date):
+        stmt = update(Game).where(Game.weekly_views > 0).values(weekly_views=_weekly_views(today))
+        connection.execute(stmt)
+
+        connection.execute(
+            delete(GameViewCount).where(GameViewCount.day < today - timedelta(days=HISTORY_DAYS))
+        )
+
+
+view_counter = ViewCounter()
@@ -0,0 +1,234 @@
+"""Profile single requests on demand by adding `__profile` to their query string.
+
+Only admins can trigger it (checked with `ProfilesApi.user_allowed`). Each profile is written
+to `PROFILE_DIR` in two files: the raw `cProfile` stats as `<id>.prof`, for snakeviz or `pstats`,
+and a `<id>.json` summary. The summary holds the slowest call paths and a per-statement breakdown
+of database time. Only the newest `PROFILE_KEEP` profiles are kept. Without the argument, a
+request pays for one dictionary lookup.
+"""
+
+import cProfile
+import json
+import pstats
+import re
+import secrets
+import tempfile
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from urllib.parse import urlencode
+
+from flask import Flask, g, request
+from sqlalchemy import event
+
+from .database import db
+
+PROFILE_DIR_KEY = "PROFILE_DIR"
+PROFILE_KEEP_KEY = "PROFILE_KEEP"
+PROFILE_ARG = "__profile"
+
+PROFILE_ID = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{8}$")
+
+TOP_FUNCTIONS = 40
+TOP_CALLEES = 5
+
+_queries: ContextVar[list | None] = ContextVar("profiled_queries", default=None)
+
+
+def _function_name(function: tuple) -> str:
+    filename, line, name = function
+
+    return f"{name} ({filename}:{line})" if line else name
+
+
+def summarize(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> list[dict]:
+    """The functions with the most cumulative time, each with its most expensive callees."""
+    callees = {}
+
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, calls, tottime, cumtime) in callers.items():
+            callees.setdefault(caller, []).append((cumtime, calls, function))
+
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+
+    return [
+        {
+            "function": _function_name(function),
+            "calls": calls,
+            "own_seconds": tottime,
+            "cumulative_seconds": cumtime,
+            "callees": [
+                {"function": _function_name(callee), "calls": count, "cumulative_seconds": seconds}
+                for seconds, count, callee in sorted(callees.get(function, []), reverse=True)[
+                    :TOP_CALLEES
+                ]
+            ],
+        }
+        for function, (_, calls, tottime, cumtime, _) in ranked[:limit]
+    ]
+
+
+def _query_breakdown(queries: list[tuple[str, float]]) -> list[dict]:
+    statements = {}
+
+    for statement, seconds in queries:
+        entry = statements.setdefault(statement, {"statement": statement, "calls": 0, "seconds": 0})
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+
+    return sorted(statements.values(), key=lambda entry: entry["seconds"], reverse=True)
+
+
+def _profiled_path() -> str:
+    args = [(key, value) for key, value in request.args.items(multi=True) if key != PROFILE_ARG]
+
+    return f"{request.path}?{urlencode(args)}" if args else request.path
+
+
+class Profiler:
+    def __init__(self, app: Flask | None = None) -> None:
+        # Only one `cProfile` profiler can be active per interpreter
+        self._lock = Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.directory = Path(
+            app.config.get(PROFILE_DIR_KEY) or Path(tempfile.gettempdir()) / "gamecafe-profiles"
+        )
+        self.keep = int(app.config.get(PROFILE_KEEP_KEY, 50))
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            if _queries.get() is not None:
+                conn.info["profile_query_start"] = time.perf_counter()
+
+        @event.listens_for(db.engine, "after_cursor_execute")
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            if (queries := _queries.get()) is not None and (
+                started := conn.info.pop("profile_query_start", None)
+            ) is not None:
+                queries.append((statement, time.perf_counter() - started))
+
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.abandon)
+
+    def start(self):
+        if PROFILE_ARG not in request.args:
+            return
+
+        from .views import ProfilesApi
+
+        if not ProfilesApi.user_allowed() or not self._lock.acquire(blocking=False):
+            return
+
+        g.profile = (cProfile.Profile(), _queries.set([]), time.perf_counter())
+        g.profile[0].enable()
+
+    def finish(self, response):
+        if (profile := g.pop("profile", None)) is None:
+            return response
+
+        profiler, token, start = profile
+
+        try:
+            profiler.disable()
+            duration = time.perf_counter() - start
+            queries = _queries.get()
+            _queries.reset(token)
+        finally:
+            self._lock.release()
+
+        profile_id = self.save(profiler, queries, duration, response)
+        response.headers["X-Profile-Id"] = profile_id
+
+        return response
+
+    def abandon(self, exception=None):
+        # The request failed before `finish` could run
+        if (profile := g.pop("profile", None)) is not None:
+            profile[0].disable()
+            _queries.reset(profile[1])
+            self._lock.release()
+
+    def save(self, profiler: cProfile.Profile, queries, duration: float, response) -> str:
+        now = datetime.now()
+        profile_id = f"{now:%Y%m%dT%H%M%S%f}-{secrets.token_hex(4)}"
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(self.directory / f"{profile_id}.prof")
+
+        summary = {
+            "id": profile_id,
+            "created": now.isoformat(),
+            "method": request.method,
+            "path": _profiled_path(),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "seconds": duration,
+            "query_count": len(queries),
+            "query_seconds": sum(seconds for _, seconds in queries),
+            "queries": _query_breakdown(queries),
+            "functions": summarize(stats),
+        }
+
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(summary, indent=2))
+
+        self._trim()
+
+        return profile_id
+
+    def _trim(self):
+        for path in sorted(self.directory.glob("*.json"))[: -self.keep]:
+            path.with_suffix(".prof").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+
+    def _path(self, profile_id: str, suffix: str) -> Path | None:
+        if PROFILE_ID.match(profile_id) is None:
+            return None
+
+        path = self.directory / f"{profile_id}{suffix}"
+
+        return path if path.is_file() else None
+
+    def list(self) -> list[dict]:
+        """Every kept profile, newest first, without its call and query breakdowns."""
+        profiles = []
+
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                summary = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+
+            del summary["queries"], summary["functions"]
+            profiles.append(summary)
+
+        return profiles
+
+    def read(self, profile_id: str) -> dict | None:
+        if (path := self._path(profile_id, ".json")) is None:
+            return None
+
+        return json.loads(path.read_text())
+
+    def stats_path(self, profile_id: str) -> Path | None:
+        return self._path(profile_id, ".prof")
+
+    def delete(self, profile_id: str) -> bool:
+        if (path := self._path(profile_id, ".json")) is None:
+            return False
+
+        path.with_suffix(".prof").unlink(missing_ok=True)
+        path.unlink()
+
+        return True
+
+
+profiler = Profiler()
@@ -0,0 +1,129 @@
+import json
+import re
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import func, select, text
+
+from .models import (
+    Collection,
+    CollectionGame,
+    Game,
+    GameSimilarity,
+    Job,
+    Publisher,
+    Report,
+    Tag,
+    User,
+    db,
+)
+from .scheduler import featured_collections
+
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def _hot_queries() -> dict[str, Callable]:
+    """Statements behind the request and CLI paths that must stay index-backed."""
+    return {
+        "user by username": lambda: User.select().where(func.lower(User.username) == "player"),
+        "user by email": lambda: User.select().where(func.lower(User.email) == "a@example.com"),
+        "game by bgg_id": lambda: Game.select().where(Game.bgg_id == 13),
+        "stale games": lambda: Game.select().where(Game.last_updated <= datetime(2000, 1, 1)),
+        "stalest game": lambda: Game.select()
+        .where(Game.last_updated <= datetime(2000, 1, 1))
+        .order_by(Game.last_updated)
+        .limit(1),
+        "featured collections": lambda: featured_collections(datetime(2000, 1, 1)),
+        "highlighted collection": lambda: Collection.select()
+        .where(Collection.highlighted == True)
+        .limit(1),
+        "reports by game": lambda: Report.select().where(Report.game_id == 1),
+        "runnable jobs": lambda: Job.select()
+        .where(Job.status == Job.Status.QUEUED, Job.run_after <= datetime(2000, 1, 1))
+        .order_by(Job.run_after, Job.id)
+        .limit(1),
+        "tags by popularity": lambda: Tag.select()
+        .where(Tag.game_count > 0)
+        .order_by(*Tag.popular_first())
+        .limit(12),
+        "tags of type by popularity": lambda: Tag.select()
+        .where(Tag.game_count > 0, Tag.type == Tag.Type.MECHANIC)
+        .order_by(*Tag.popular_first())
+        .limit(12),
+        "publishers by popularity": lambda: Publisher.select()
+        .where(Publisher.game_count > 0)
+        .order_by(*Publisher.popular_first())
+        .limit(12),
+        "popular games": lambda: Game.select()
+        .where(Game.weekly_views > 0)
+        .order_by(*Game.popular_first())
+        .limit(8),
+        "games by tag": lambda: Game.filter(tag_ids=[1, 2]),
+        "games by tag type": lambda: Game.filter(tag_types=[Tag.Type.MECHANIC]),
+        "games by publisher": lambda: Game.filter(publisher_ids=[1], match_all=False),
+        "games by players": lambda: Game.filter(players=4, max_time=60),
+        "games by weight": lambda: Game.filter(min_time=30, max_weight=2.5),
+        "collection games": lambda: Game.select()
+        .join(CollectionGame, CollectionGame.game_id == Game.id)
+        .where(CollectionGame.collection_id == 1),
+        "similar games": lambda: Game.select()
+        .join(GameSimilarity, GameSimilarity.similar_game_id == Game.id)
+        .where(GameSimilarity.game_id == 1)
+        .order_by(GameSimilarity.score.desc())
+        .limit(8),
+        "games listing a similar game": lambda: select(GameSimilarity.game_id).where(
+            GameSimilarity.similar_game_id.in_([1, 2])
+        ),
+        "collections of game": lambda: Collection.select()
+        .join(CollectionGame, CollectionGame.collection_id == Collection.id)
+        .where(CollectionGame.game_id == 1),
+    }
+
+
+def _sqlite_full_scans(sql: str) -> list[str]:
+    tables = db.Base.metadata.tables
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+
+    return [
+        detail
+        for *_, detail in rows
+        if (match := SQLITE_SCAN.match(detail)) is not None and match.group(1) in tables
+    ]
+
+
+def _postgresql_full_scans(sql: str) -> list[str]:
+    # Tiny development tables are always cheaper to scan, so only fall back when there is no index
+    db.session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]["Plan"]]
+
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get("Plans", []))
+
+        if node["Node Type"] == "Seq Scan":
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+
+    return scans
+
+
+def full_scans() -> dict[str, list[str]]:
+    """EXPLAIN every hot query on the configured database and collect its full table scans."""
+    dialect = db.engine.dialect
+    explain = {"sqlite": _sqlite_full_scans, "postgresql": _postgresql_full_scans}[dialect.name]
+
+    results = {}
+
+    try:
+        for name, build in _hot_queries().items():
+            compiled = build().compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+            results[name] = explain(str(compiled))
+    finally:
+        db.session.rollback()
+
+    return results
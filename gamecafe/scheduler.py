@@ -0,0 +1,100 @@
+"""Continuous, rate-limited refreshing of the stalest games from BGG.
+
+Instead of refreshing everything older than a date in one burst, `run` refreshes one game per
+slot, with slots spaced evenly to stay within `REFRESH_REQUESTS_PER_HOUR`. Each slot goes to the
+stalest game in a highlighted or recently viewed collection, and otherwise to the stalest game
+overall, as long as it is older than `REFRESH_MIN_AGE_HOURS`. A catalogue of N games is therefore
+fully refreshed every N / budget hours at a flat request rate.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, select
+
+from .models import Collection, CollectionGame, Game, db
+
+REFRESH_REQUESTS_PER_HOUR_KEY = "REFRESH_REQUESTS_PER_HOUR"
+REFRESH_MIN_AGE_HOURS_KEY = "REFRESH_MIN_AGE_HOURS"
+
+# Collections viewed this recently count as featured
+RECENTLY_VIEWED = timedelta(days=7)
+
+
+def featured_collections(now: datetime):
+    return select(Collection.id).where(
+        or_(Collection.highlighted == True, Collection.last_viewed >= now - RECENTLY_VIEWED)
+    )
+
+
+def next_game(min_age: timedelta, exclude=()) -> Game | None:
+    """The game to refresh next, or `None` when every game is newer than `min_age`."""
+    now = datetime.now()
+    stale = Game.last_updated <= now - min_age
+
+    if exclude:
+        stale = stale & Game.id.not_in(exclude)
+
+    featured = (
+        Game.select()
+        .join(CollectionGame, CollectionGame.game_id == Game.id)
+        .where(CollectionGame.collection_id.in_(featured_collections(now)), stale)
+        .order_by(Game.last_updated)
+        .limit(1)
+    )
+
+    if (game := db.session.scalar(featured)) is not None:
+        return game
+
+    return db.session.scalar(Game.select().where(stale).order_by(Game.last_updated).limit(1))
+
+
+def run(requests_per_hour: int | None = None, limit: int | None = None, progress=print):
+    """Refresh games at an even pace until interrupted, or until `limit` games were refreshed."""
+    import requests_cache
+
+    from .similarity import update
+    from .tasks import refresh_game
+
+    config = current_app.config
+    requests_per_hour = requests_per_hour or config.get(REFRESH_REQUESTS_PER_HOUR_KEY, 120)
+    min_age = timedelta(hours=config.get(REFRESH_MIN_AGE_HOURS_KEY, 24))
+
+    interval = 3600 / requests_per_hour
+
+    # Revalidate instead of answering from the cache, which would make refreshing pointless
+    rc = requests_cache.CachedSession(stale_if_error=True, expire_after=0)
+
+    refreshed = 0
+    failed = set()
+    next_slot = time.monotonic()
+
+    while limit is None or refreshed < limit:
+        # Sleeping until the next slot, rather than for `interval`, keeps slow responses from
+        # stretching the schedule and a backlog from bursting to catch up
+        time.sleep(max(next_slot - time.monotonic(), 0))
+        next_slot = max(next_slot + interval, time.monotonic())
+
+        if (game := next_game(min_age, failed)) is None:
+            # Games that failed are retried once everything else is fresh
+            failed.clear()
+            db.session.rollback()
+            continue
+
+        try:
+            features_changed = refresh_game(game, rc=rc)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Refreshing game %s failed", game.bgg_id)
+
+            failed.add(game.id)
+            continue
+
+        if features_changed:
+            update([game.id])
+
+        refreshed += 1
+        progress(f"Refreshed {game.name} ({refreshed})")
+
+    return refreshed
@@ -0,0 +1,210 @@
+"""Top-k "similar games" from shared tags and publishers.
+
+Every game is a sparse binary vector over its tags and publishers, weighted by inverse document
+frequency so that a niche mechanic says more than "Card Game". Cosine similarities are only ever
+accumulated along the postings of the features a game actually has, which keeps a full rebuild
+proportional to the number of co-occurring pairs rather than to the square of the catalogue.
+"""
+
+from collections import defaultdict
+from heapq import nlargest
+from math import log, sqrt
+
+from sqlalchemy import delete, func, insert, select, union
+
+from .models import Game, GameSimilarity, db, game_tag_table, publisher_game_table
+
+TOP_K = 8
+
+BATCH_SIZE = 1000
+
+FEATURE_SOURCES = (
+    ("tag", game_tag_table.c.game_id, game_tag_table.c.tag_id),
+    ("publisher", publisher_game_table.c.game_id, publisher_game_table.c.publisher_id),
+)
+
+
+def _ranked(scores: dict[int, float], k: int) -> list[tuple[int, float]]:
+    # Ties broken on the id so that rebuilds are stable
+    return nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def _sharing_features(game_ids):
+    """The games with a tag or publisher in common with one of `game_ids`, as a subquery."""
+    return union(
+        *(
+            select(game_id).where(item_id.in_(select(item_id).where(game_id.in_(game_ids))))
+            for _, game_id, item_id in FEATURE_SOURCES
+        )
+    )
+
+
+class FeatureIndex:
+    """Features of a set of games, with postings complete for the games it was loaded around."""
+
+    def __init__(
+        self,
+        features: dict[int, set[tuple[str, int]]],
+        document_counts: dict[tuple[str, int], int] | None = None,
+        total: int | None = None,
+    ) -> None:
+        self.features = features
+        self.postings: dict[tuple[str, int], list[int]] = defaultdict(list)
+
+        for game_id, game_features in features.items():
+            for feature in game_features:
+                self.postings[feature].append(game_id)
+
+        if document_counts is None:
+            document_counts = {feature: len(games) for feature, games in self.postings.items()}
+
+        total = len(features) if total is None else total
+        self.idf = {feature: log(total / count) for feature, count in document_counts.items()}
+
+        self.norms = {
+            game_id: sqrt(sum(self.idf[feature] ** 2 for feature in game_features))
+            for game_id, game_features in features.items()
+        }
+
+    @classmethod
+    def load(cls, session=None) -> "FeatureIndex":
+        """The index of the whole catalogue."""
+        session = session or db.session
+        features = {game_id: set() for game_id in session.scalars(select(Game.id))}
+
+        for kind, game_id, item_id in FEATURE_SOURCES:
+            for game, item in session.execute(select(game_id, item_id)):
+                features[game].add((kind, item))
+
+        return cls(features)
+
+    @classmethod
+    def load_around(cls, game_ids, session=None) -> "FeatureIndex":
+        """Just enough of the index to score `game_ids` against every other game.
+
+        That is the features of every game sharing one with them, which makes the postings of their
+        own features complete and gives the norms, and the catalogue-wide counts of those features.
+        """
+        session = session or db.session
+        neighbours = _sharing_features(game_ids)
+
+        features = {game_id: set() for game_id in game_ids}
+        document_counts = {}
+
+        for kind, game_id, item_id in FEATURE_SOURCES:
+            stmt = select(game_id, item_id).where(game_id.in_(neighbours))
+
+            for game, item in session.execute(stmt):
+                features.setdefault(game, set()).add((kind, item))
+
+            stmt = (
+                select(item_id, func.count())
+                .where(item_id.in_(select(item_id).where(game_id.in_(neighbours))))
+                .group_by(item_id)
+            )
+
+            for item, count in session.execute(stmt):
+                document_counts[(kind, item)] = count
+
+        total = session.scalar(select(func.count(Game.id)))
+
+        return cls(features, document_counts, total)
+
+    def scores(self, game_id: int) -> dict[int, float]:
+        """Cosine similarity of `game_id` to every other game sharing at least one feature."""
+        if not (norm := self.norms.get(game_id)):
+            return {}
+
+        dots = defaultdict(float)
+
+        for feature in self.features[game_id]:
+            if (weight := self.idf[feature] ** 2) == 0:
+                continue
+
+            for other in self.postings[feature]:
+                dots[other] += weight
+
+        dots.pop(game_id, None)
+
+        return {other: dot / (norm * self.norms[other]) for other, dot in dots.items()}
+
+    def top(self, game_id: int, k: int = TOP_K) -> list[tuple[int, float]]:
+        return _ranked(self.scores(game_id), k)
+
+
+def _store(neighbours: dict[int, list[tuple[int, float]]], session) -> int:
+    rows = [
+        {"game_id": game_id, "similar_game_id": other, "score": score}
+        for game_id, top in neighbours.items()
+        for other, score in top
+    ]
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        session.execute(insert(GameSimilarity), rows[start : start + BATCH_SIZE])
+
+    return len(rows)
+
+
+def build_all(k: int = TOP_K, session=None) -> int:
+    """Recompute every game's neighbours, returning the number of stored pairs."""
+    session = session or db.session
+    index = FeatureIndex.load(session)
+
+    session.execute(delete(GameSimilarity))
+    count = _store({game_id: index.top(game_id, k) for game_id in index.features}, session)
+
+    session.commit()
+
+    return count
+
+
+def update(game_ids, k: int = TOP_K, session=None) -> int:
+    """Refresh the neighbours of games whose tags or publishers changed.
+
+    The changed games, and the games that listed one of them, are recomputed from an index loaded
+    around them alone. Similarity is symmetric, so any other game's top k can only change by taking
+    in a changed game, which is merged into its stored neighbours. The IDF weights of untouched
+    pairs drift slightly until the next `build_all`.
+    """
+    session = session or db.session
+    changed = set(game_ids)
+
+    if not changed:
+        return 0
+
+    stmt = select(GameSimilarity.game_id).where(GameSimilarity.similar_game_id.in_(changed))
+    recomputed = changed | set(session.scalars(stmt))
+
+    index = FeatureIndex.load_around(recomputed, session)
+    neighbours = {game_id: index.top(game_id, k) for game_id in recomputed}
+
+    # The new scores of the changed games, seen from each other game they share a feature with
+    incoming = defaultdict(dict)
+
+    for game_id in changed:
+        for other, score in index.scores(game_id).items():
+            if other not in recomputed:
+                incoming[other][game_id] = score
+
+    current = defaultdict(dict)
+
+    if incoming:
+        stmt = select(
+            GameSimilarity.game_id, GameSimilarity.similar_game_id, GameSimilarity.score
+        ).where(GameSimilarity.game_id.in_(incoming))
+
+        for game_id, other, score in session.execute(stmt):
+            current[game_id][other] = score
+
+    for other, scores in incoming.items():
+        stored = current[other]
+
+        if len(stored) < k or max(scores.values()) > min(stored.values()):
+            neighbours[other] = _ranked(stored | scores, k)
+
+    session.execute(delete(GameSimilarity).where(GameSimilarity.game_id.in_(neighbours)))
+    _store(neighbours, session)
+
+    session.commit()
+
+    return len(neighbours)
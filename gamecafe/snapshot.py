@@ -0,0 +1,271 @@
+"""Versioned catalogue archives for setting up or recovering an instance without BGG.
+
+A snapshot is a gzipped tar holding, in order, `snapshot.json`, one `tables/<name>.jsonl` per
+catalogue table (a header line of column names, then one JSON array per row, in foreign key order)
+and the image files under `images/<key>`.
+"""
+
+import json
+import tarfile
+from contextlib import closing
+from datetime import date, datetime
+from enum import Enum
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from tempfile import SpooledTemporaryFile
+from typing import Callable
+
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import Date, DateTime, func, insert, select, text
+
+from .models import Game, db
+from .storage import is_content_key, portable_key, storage
+
+SNAPSHOT_VERSION = 1
+
+MANIFEST_NAME = "snapshot.json"
+TABLES_DIRECTORY = "tables"
+IMAGES_DIRECTORY = "images"
+
+CATALOGUE_TABLES = {
+    "publishers",
+    "tags",
+    "games",
+    "publisher_game_table",
+    "game_tag_table",
+    "collections",
+    "collection_games",
+    "game_similarities",
+}
+
+BATCH_SIZE = 1000
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _catalogue_tables():
+    return [table for table in db.Base.metadata.sorted_tables if table.name in CATALOGUE_TABLES]
+
+
+def _schema_revision() -> str | None:
+    return MigrationContext.configure(db.session.connection()).get_current_revision()
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    if isinstance(value, Enum):
+        return value.name
+
+    return value
+
+
+def _decoder(column) -> Callable:
+    if isinstance(column.type, DateTime):
+        return lambda value: None if value is None else datetime.fromisoformat(value)
+
+    if isinstance(column.type, Date):
+        return lambda value: None if value is None else date.fromisoformat(value)
+
+    return lambda value: value
+
+
+def _image_key(name: PurePosixPath) -> str:
+    """The storage key of an `images/` archive member, refusing any that would leave the store."""
+    key = PurePosixPath(*name.parts[1:]).as_posix()
+
+    # Legacy keys are bare file names directly in the storage root
+    if not is_content_key(key) and (len(name.parts) != 2 or name.parts[1] == ".."):
+        raise SnapshotError(f"Invalid image key {key}")
+
+    return key
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, BytesIO(data))
+
+
+def export_snapshot(path: str | Path, include_images: bool = True, progress=print) -> dict:
+    tables = _catalogue_tables()
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "schema": _schema_revision(),
+        "created": datetime.now().isoformat(),
+        "tables": {},
+        "images": 0,
+    }
+
+    image_keys = set()
+
+    with tarfile.open(path, "w|gz") as tar:
+        table_files = []
+
+        for table in tables:
+            columns = [column.name for column in table.columns]
+            image_column = columns.index("image_path") if table.name == "games" else None
+
+            # Tar members need their size up front, so rows are staged before being added
+            staged = SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+            staged.write((json.dumps(columns) + "\n").encode("utf-8"))
+
+            rows = db.session.execute(select(table).execution_options(yield_per=BATCH_SIZE))
+            count = 0
+
+            for row in rows:
+                values = [_encode(value) for value in row]
+
+                if image_column is not None and values[image_column] is not None:
+                    image_keys.add(values[image_column])
+                    values[image_column] = portable_key(values[image_column])
+
+                staged.write((json.dumps(values, separators=(",", ":")) + "\n").encode("utf-8"))
+                count += 1
+
+            manifest["tables"][table.name] = count
+            table_files.append((table.name, staged))
+            progress(f"Exported {count} rows from {table.name}")
+
+        if include_images:
+            manifest["images"] = len(image_keys)
+
+        _add_bytes(tar, MANIFEST_NAME, json.dumps(manifest, indent=2).encode("utf-8"))
+
+        for name, staged in table_files:
+            with staged:
+                info = tarfile.TarInfo(f"{TABLES_DIRECTORY}/{name}.jsonl")
+                info.size = staged.tell()
+                staged.seek(0)
+                tar.addfile(info, staged)
+
+        if include_images:
+            for key in sorted(image_keys):
+                if not storage.exists(key):
+                    progress(f"Skipping missing image {key}")
+                    continue
+
+                with closing(storage.open(key)) as image:
+                    _add_bytes(tar, f"{IMAGES_DIRECTORY}/{portable_key(key)}", image.read())
+
+            progress(f"Exported {len(image_keys)} images")
+
+    return manifest
+
+
+def _reset_sequences(tables):
+    if db.engine.dialect.name != "postgresql":
+        return
+
+    for table in tables:
+        if "id" not in table.columns:
+            continue
+
+        db.session.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"coalesce((SELECT max(id) FROM {table.name}), 0) + 1, false)"
+            )
+        )
+
+
+def import_snapshot(path: str | Path, progress=print) -> dict:
+    """Restore a snapshot into an empty catalogue with bulk inserts in a single transaction.
+
+    Images are streamed into storage as they come, and the ones this import added are deleted
+    again when the transaction rolls back.
+    """
+    tables = {table.name: table for table in _catalogue_tables()}
+    manifest = None
+
+    if db.session.scalar(select(func.count(Game.id))):
+        raise SnapshotError("The games table is not empty")
+
+    existing_images = set(storage.keys())
+    added_images = []
+    restored_tables = set()
+
+    try:
+        with tarfile.open(path, "r|gz") as tar:
+            for member in tar:
+                name = PurePosixPath(member.name)
+                data = tar.extractfile(member)
+
+                if member.name == MANIFEST_NAME:
+                    manifest = json.load(data)
+
+                    if manifest["version"] != SNAPSHOT_VERSION:
+                        raise SnapshotError(f"Unsupported snapshot version {manifest['version']}")
+
+                    if manifest["schema"] != (schema := _schema_revision()):
+                        raise SnapshotError(
+                            f"Snapshot schema {manifest['schema']} does not match database {schema}"
+                        )
+
+                elif manifest is None:
+                    raise SnapshotError(f"{MANIFEST_NAME} must be the first archive member")
+
+                elif name.parent.name == TABLES_DIRECTORY:
+                    if (table := tables.get(name.stem)) is None:
+                        raise SnapshotError(f"Unknown table {name.stem}")
+
+                    lines = iter(data)
+                    columns = json.loads(next(lines))
+                    decoders = [_decoder(table.columns[column]) for column in columns]
+
+                    batch = []
+                    count = 0
+                    stmt = insert(table)
+
+                    for line in lines:
+                        count += 1
+                        values = json.loads(line)
+                        batch.append(
+                            {c: decode(v) for c, decode, v in zip(columns, decoders, values)}
+                        )
+
+                        if len(batch) == BATCH_SIZE:
+                            db.session.execute(stmt, batch)
+                            batch = []
+
+                    if batch:
+                        db.session.execute(stmt, batch)
+
+                    if count != (expected := manifest["tables"].get(table.name)):
+                        raise SnapshotError(
+                            f"{table.name} has {count} rows, the manifest lists {expected}"
+                        )
+
+                    restored_tables.add(table.name)
+                    progress(f"Restored {count} rows into {table.name}")
+
+                elif name.parts[0] == IMAGES_DIRECTORY:
+                    key = _image_key(name)
+                    storage.save(key, data)
+
+                    if key not in existing_images:
+                        added_images.append(key)
+
+        if manifest is None:
+            raise SnapshotError(f"{MANIFEST_NAME} is missing")
+
+        if missing := set(manifest["tables"]) - restored_tables:
+            raise SnapshotError(f"The archive is missing tables {', '.join(sorted(missing))}")
+
+        _reset_sequences(tables.values())
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+
+        for key in added_images:
+            storage.delete(key)
+
+        raise
+
+    progress(f"Restored {manifest['images']} images")
+
+    return manifest
@@ -10,13 +10,7 @@ window.addEventListener("load", () => {
     maxItems: 1,
     preload: "focus",
     load: (query, callback) => {
-      let q = "";
-
-      if (query.length) {
-        q = `?q=${query}`;
-      }
-
-      fetch(`/api/games${q}`)
+      fetch(`/api/games/autocomplete?q=${encodeURIComponent(query)}`)
         .then((resp) => resp.json())
         .then((json) => callback(json.data.items))
         .catch(() => callback());
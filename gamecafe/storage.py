@@ -0,0 +1,228 @@
+import hashlib
+import re
+import shutil
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from typing import BinaryIO, Iterator
+
+from flask import Flask
+
+IMAGE_STORAGE_BACKEND_KEY = "IMAGE_STORAGE_BACKEND"
+
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+CONTENT_KEY = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}$")
+
+
+def content_key(digest: str) -> str:
+    # Sharded on the first byte so no local directory grows past a few thousand files
+    return f"{digest[:2]}/{digest}"
+
+
+def is_content_key(key: str) -> bool:
+    return CONTENT_KEY.match(key) is not None
+
+
+def portable_key(key: str) -> str:
+    """`key` relative to the storage root; legacy image paths are absolute, directly in it."""
+    return PurePosixPath(key).name if key.startswith("/") else key
+
+
+class Storage:
+    """Where game images live, addressed by key (the value stored in `Game.image_path`)."""
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: str | None = None) -> str:
+        raise NotImplementedError()
+
+    def open(self, key: str) -> BinaryIO:
+        raise NotImplementedError()
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError()
+
+    def delete(self, key: str):
+        raise NotImplementedError()
+
+    def keys(self, older_than: datetime | None = None) -> Iterator[str]:
+        """Every stored key, or only those last modified before the (UTC) `older_than`."""
+        raise NotImplementedError()
+
+    def url(self, key: str) -> str | None:
+        """A URL clients can fetch `key` from directly, or `None` when the app has to serve it."""
+        return None
+
+    def save_content(self, fileobj: BinaryIO, content_type: str | None = None) -> str:
+        """Store `fileobj` under the SHA-256 of its content, once, returning the key."""
+        digest = hashlib.sha256()
+
+        with SpooledTemporaryFile(max_size=MULTIPART_CHUNK_SIZE) as staged:
+            while chunk := fileobj.read(64 * 1024):
+                digest.update(chunk)
+                staged.write(chunk)
+
+            key = content_key(digest.hexdigest())
+
+            if not self.exists(key):
+                staged.seek(0)
+                self.save(key, staged, content_type)
+
+        return key
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        # Keys written before storage backends existed are absolute paths, which `/` keeps as is
+        return self.root / key
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: str | None = None) -> str:
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written aside and renamed into place, so a crash never leaves a truncated image under a
+        # content key that would be trusted from then on. `gc-images` removes abandoned ones.
+        with NamedTemporaryFile(
+            "wb", dir=path.parent, prefix=".", suffix=".tmp", delete=False
+        ) as f:
+            temporary = Path(f.name)
+
+            try:
+                shutil.copyfileobj(fileobj, f)
+            except BaseException:
+                temporary.unlink()
+                raise
+
+        # Temporary files are private to their owner, unlike the images they become
+        temporary.chmod(0o644)
+        temporary.replace(path)
+
+        return key
+
+    def open(self, key: str) -> BinaryIO:
+        return self.path(key).open("rb")
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def delete(self, key: str):
+        self.path(key).unlink(missing_ok=True)
+
+    def keys(self, older_than: datetime | None = None) -> Iterator[str]:
+        cutoff = None if older_than is None else older_than.timestamp()
+
+        for path in self.root.rglob("*"):
+            if path.is_file() and (cutoff is None or path.stat().st_mtime < cutoff):
+                yield path.relative_to(self.root).as_posix()
+
+
+class S3Storage(Storage):
+    """Images in an S3-compatible bucket, handed to clients as public or presigned URLs."""
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str | None = None,
+        region: str | None = None,
+        public_url: str | None = None,
+        presign_seconds: int = 3600,
+    ) -> None:
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.presign_seconds = presign_seconds
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_CHUNK_SIZE, multipart_chunksize=MULTIPART_CHUNK_SIZE
+        )
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: str | None = None) -> str:
+        extra_args = {"ContentType": content_type} if content_type else None
+
+        # Streams `fileobj`, switching to a multipart upload past the threshold
+        self.client.upload_fileobj(
+            fileobj, self.bucket, key, ExtraArgs=extra_args, Config=self.transfer_config
+        )
+
+        return key
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+
+            raise
+
+        return True
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def keys(self, older_than: datetime | None = None) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+
+        for page in paginator.paginate(Bucket=self.bucket):
+            for item in page.get("Contents", []):
+                if older_than is None or item["LastModified"] < older_than:
+                    yield item["Key"]
+
+    def url(self, key: str) -> str | None:
+        if self.public_url is not None:
+            return f"{self.public_url}/{key}"
+
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=self.presign_seconds,
+        )
+
+
+class ImageStorage:
+    """The storage backend selected by `IMAGE_STORAGE_BACKEND`, created on first use."""
+
+    def __init__(self, app: Flask | None = None) -> None:
+        self._config = None
+        self._backend = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self._config = app.config
+        self._backend = None
+
+    @property
+    def backend(self) -> Storage:
+        if self._backend is None:
+            config = self._config
+
+            if config.get(IMAGE_STORAGE_BACKEND_KEY, "local") == "s3":
+                self._backend = S3Storage(
+                    config["S3_BUCKET"],
+                    endpoint_url=config.get("S3_ENDPOINT_URL"),
+                    region=config.get("S3_REGION"),
+                    public_url=config.get("S3_PUBLIC_URL"),
+                    presign_seconds=int(config.get("S3_PRESIGN_SECONDS", 3600)),
+                )
+            else:
+                self._backend = LocalStorage(config["IMAGE_STORAGE_ROOT"])
+
+        return self._backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+storage = ImageStorage()
@@ -0,0 +1,190 @@
+"""The long-running BGG operations, shared by the CLI commands and the job worker.
+
+Every task takes a `progress(done, total, message)` callback. The BGG client (and `requests` with
+it) is imported inside the tasks so that web workers can import this module to enqueue jobs.
+"""
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable
+
+from sqlalchemy import select, update
+
+from .models import Game, Publisher, Tag, db
+from .storage import storage
+
+if TYPE_CHECKING:
+    from .board_game_geek import BoardGameGeek
+
+Progress = Callable[[int, int | None, str], None]
+
+
+def print_progress(done: int, total: int | None, message: str):
+    print(message)
+
+
+def get_publishers(bgg_publishers: list["BoardGameGeek.Publisher"]) -> list[Publisher]:
+    pubs = []
+    for bgg_publisher in bgg_publishers:
+        if (publisher := Publisher.get_by_bgg_id(bgg_publisher.id)) is None:
+            publisher = Publisher(bgg_publisher.id, bgg_publisher.name).save(commit=False)
+
+        pubs.append(publisher)
+
+    return pubs
+
+
+TAG_TYPE_MAP = {"boardgamecategory": Tag.Type.CATEGORY, "boardgamemechanic": Tag.Type.MECHANIC}
+
+
+def get_tags(bgg_tags: list["BoardGameGeek.Tag"]) -> list[Tag]:
+    tags = []
+    for bgg_tag in bgg_tags:
+        if (tag := Tag.get_by_bgg_id(bgg_tag.id)) is None:
+            tag_type = TAG_TYPE_MAP[bgg_tag.type]
+
+            tag = Tag(bgg_tag.id, bgg_tag.name, tag_type).save(commit=False)
+
+        tags.append(tag)
+
+    return tags
+
+
+def apply_details(game: Game, bgg_game: "BoardGameGeek.Game") -> bool:
+    """Copy BGG's details onto `game`, returning whether its tags or publishers changed."""
+    features = set(game.publishers), set(game.tags)
+
+    game.publishers = get_publishers(bgg_game.publishers)
+    game.tags = get_tags(bgg_game.tags)
+
+    game.min_players = bgg_game.min_players
+    game.max_players = bgg_game.max_players
+    game.playing_time = bgg_game.playing_time
+    game.weight = bgg_game.weight
+    game.year_published = bgg_game.year_published
+
+    return features != (set(game.publishers), set(game.tags))
+
+
+def update_image(game: Game, bgg_game: "BoardGameGeek.Game"):
+    """Point `game` at BGG's current cover, downloading it only when no game has it yet."""
+    if bgg_game.image_url is None:
+        return
+
+    if bgg_game.image_url == game.image_url and game.image_path is not None:
+        return
+
+    stmt = (
+        select(Game.image_path)
+        .where(Game.image_url == bgg_game.image_url, Game.image_path.is_not(None))
+        .limit(1)
+    )
+
+    if (image_path := db.session.scalar(stmt)) is None:
+        image_path = bgg_game.save_image(storage)
+
+    game.image_path = image_path
+    game.image_url = bgg_game.image_url
+
+
+def import_collection(
+    username: str, mark_missing: bool = False, progress: Progress = print_progress
+):
+    """Add the games in `username`'s BGG collection that are not in the catalogue yet.
+
+    Games already imported are left to `refresh_game`, so only new games cost `/thing` requests.
+    With `mark_missing`, catalogue games absent from the collection get `left_collection` set, and
+    games back in it get it cleared. Leave it off when the catalogue merges several collections.
+    """
+    from .board_game_geek import BoardGameGeek
+    from .similarity import update as update_similarities
+
+    progress(0, None, "Fetching collection")
+    items = BoardGameGeek.get_collection(username)
+
+    collection_ids = {item.id for item in items}
+    catalogue_ids = set(db.session.scalars(select(Game.bgg_id)))
+
+    comments = {item.id: item.comment for item in items}
+    new_ids = sorted(collection_ids - catalogue_ids)
+
+    progress(0, len(new_ids), f"{len(new_ids)} of {len(items)} games are new")
+
+    bgg_games = BoardGameGeek.get_games(new_ids, progress=progress)
+    changed = []
+
+    for i, bgg_game in enumerate(bgg_games):
+        progress(i, len(bgg_games), f"Processing game: {bgg_game.name}")
+
+        game = Game(bgg_game.id, bgg_game.name, None)
+        game.location = comments.get(bgg_game.id)
+
+        update_image(game, bgg_game)
+        apply_details(game, bgg_game)
+
+        game.save()
+        changed.append(game.id)
+
+    # An empty collection is more likely a private or mistyped one than a sold-off shelf
+    if mark_missing and collection_ids:
+        now = datetime.now()
+        marks = (
+            (Game.bgg_id.not_in(collection_ids) & Game.left_collection.is_(None), now),
+            (Game.bgg_id.in_(collection_ids) & Game.left_collection.is_not(None), None),
+        )
+
+        # Core updates skip the session hook that moves `modified` for fragments and API ETags
+        for condition, left_collection in marks:
+            stmt = (
+                update(Game)
+                .where(condition)
+                .values(left_collection=left_collection, modified=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(stmt)
+
+        db.session.commit()
+
+    if changed:
+        update_similarities(changed)
+
+    progress(len(bgg_games), len(bgg_games), f"Imported {len(bgg_games)} new games")
+
+
+def refresh_game(game: Game, rc=None) -> bool:
+    """Fetch `game` from BGG and save it, returning whether its tags or publishers changed."""
+    from .board_game_geek import BoardGameGeek
+
+    bgg_game = BoardGameGeek.get_game(game.bgg_id, rc=rc)
+
+    update_image(game, bgg_game)
+    features_changed = apply_details(game, bgg_game)
+
+    game.last_updated = datetime.now()
+
+    game.save()
+
+    return features_changed
+
+
+def update_games(before_date: str, progress: Progress = print_progress):
+    from .similarity import update
+
+    dt = datetime.strptime(before_date, r"%Y-%m-%d").date()
+
+    stmt = Game.select().where(Game.last_updated <= dt)
+
+    games = db.session.scalars(stmt).all()
+    changed = []
+
+    for i, game in enumerate(games):
+        progress(i, len(games), f"Updating game: {game.name}")
+
+        if refresh_game(game):
+            changed.append(game.id)
+
+    db.session.commit()
+
+    if changed:
+        progress(len(games), len(games), f"Refreshing similar games for {update(changed)} games")
+
+    progress(len(games), len(games), f"Updated {len(games)} games")
@@ -1,22 +1,75 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime
 from typing import Callable
+from urllib.parse import urlencode
 
 from flask import (
     Flask,
+    abort,
     current_app,
     flash,
     jsonify,
+    make_response,
     redirect,
     render_template,
     request,
     send_file,
 )
 from flask.views import MethodView
-
-from .models import Collection, Game, Report, User, db
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import selectinload
+
+from .autocomplete import game_names
+from .jobs import JobError, enqueue
+from .metrics import image_bytes, image_redirects, metrics
+from .models import Collection, Game, IdModel, Job, Publisher, Report, Tag, User, db
+from .popularity import view_counter
+from .profiling import profiler
 from .session import clear_user, get_user, set_user
+from .storage import storage
 
 USER_ID = "user_id"
 
+FACET_LIMIT = 15
+
+BATCH_LIMIT = 500
+
+GAME_RANGE_FILTERS = {
+    "players": int,
+    "min_time": int,
+    "max_time": int,
+    "min_weight": float,
+    "max_weight": float,
+    "min_year": int,
+    "max_year": int,
+}
+
+
+def url_with_args(**changes):
+    """The current path with its query string updated; a `None` value removes the argument."""
+    args = request.args.to_dict(flat=False)
+
+    for key, value in changes.items():
+        if value is None:
+            args.pop(key, None)
+        else:
+            args[key] = [value]
+
+    return f"{request.path}?{urlencode(args, doseq=True)}"
+
+
+def url_toggling_arg(key, value):
+    """The current path with `value` added to, or removed from, the repeated argument `key`."""
+    args = request.args.to_dict(flat=False)
+    values = args.get(key, [])
+    value = str(value)
+
+    args[key] = [v for v in values if v != value] if value in values else values + [value]
+    args.pop("p", None)
+
+    return f"{request.path}?{urlencode(args, doseq=True)}"
+
 
 class RoleView(MethodView):
     ROUTE: str = None
@@ -24,6 +77,9 @@ class RoleView(MethodView):
     AUTHENTICATED: bool = False
     MINIMUM_ROLE: User.Role | None = None
 
+    # Whether posts and API changes write, so SQLite takes its write lock as they begin
+    WRITES: bool = True
+
     @classmethod
     def user_allowed(cls):
         if (cls.AUTHENTICATED or cls.MINIMUM_ROLE is not None) and (user := get_user()) is None:
@@ -43,6 +99,32 @@ class RoleView(MethodView):
         per_page = int(request.args.get("per_page", default))
         return min(max(per_page, 1), 50)
 
+    @classmethod
+    def game_filters(cls):
+        tag_types = {tag_type.value: tag_type for tag_type in Tag.Type}
+
+        return dict(
+            tag_ids=request.args.getlist("tag", type=int),
+            tag_types=[tag_types[t] for t in request.args.getlist("tag_type") if t in tag_types],
+            publisher_ids=request.args.getlist("publisher", type=int),
+            match_all=request.args.get("match", "all") != "any",
+            **{
+                key: request.args.get(key, type=cast)
+                for key, cast in GAME_RANGE_FILTERS.items()
+                if request.args.get(key)
+            },
+        )
+
+    @classmethod
+    def filtered_games(cls):
+        """The games statement for the request's facet filters, or `None` when there are none."""
+        filters = cls.game_filters()
+
+        if not any(value for key, value in filters.items() if key != "match_all"):
+            return None
+
+        return Game.filter(**filters)
+
     def dispatch_request(self, **kwargs):
         if not self.user_allowed():
             return render_template("pages/404.jinja")
@@ -133,6 +215,31 @@ class ApiView(RoleView):
 
             return jsonify(data), code
 
+        def etag(self, name: str, **kwargs) -> str | None:
+            if (version := self.api_view.version(name, **kwargs)) is None:
+                return None
+
+            return hashlib.sha1(repr((name, version)).encode("utf-8")).hexdigest()
+
+        def conditional_response(self, name: str, **kwargs):
+            """Serve a GET, or a bare 304 when the client's copy matches the data version.
+
+            The version is checked before the handler runs, so revalidating costs one query.
+            """
+            etag = self.etag(name, **kwargs)
+
+            if etag is not None and request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(self.response(getattr(self.api_view, name), **kwargs))
+
+            if etag is not None and response.status_code in (200, 304):
+                # Weak, as compression in front of the app may change the bytes
+                response.set_etag(etag, weak=True)
+                response.cache_control.no_cache = True
+
+            return response
+
         def dispatch_request(self, **kwargs):
             if not self.api_view.user_allowed():
                 return render_template("pages/404.jinja")
@@ -141,14 +248,14 @@ class ApiView(RoleView):
 
     class GroupApi(ApiCommon):
         def get(self):
-            return self.response(self.api_view.list)
+            return self.conditional_response("list")
 
         def post(self):
             return self.response(self.api_view.create)
 
     class ItemApi(ApiCommon):
         def get(self, key):
-            return self.response(self.api_view.read, key=key)
+            return self.conditional_response("read", key=key)
 
         def patch(self, key):
             return self.response(self.api_view.update, key=key)
@@ -156,14 +263,73 @@ class ApiView(RoleView):
         def delete(self, key):
             return self.response(self.api_view.delete, key=key)
 
+    class BatchApi(ApiCommon):
+        def patch(self):
+            return self.response(self.api_view.update_many)
+
+        def delete(self):
+            return self.response(self.api_view.delete_many)
+
     @classmethod
     def _register(cls, app: Flask):
         group_view = cls.GroupApi.as_view(f"{cls.__name__}-group", cls)
         item_view = cls.ItemApi.as_view(f"{cls.__name__}-items", cls)
+        batch_view = cls.BatchApi.as_view(f"{cls.__name__}-batch", cls)
 
         app.add_url_rule(cls.ROUTE, view_func=group_view)
+        # Registered as a static path, so it takes precedence over an item keyed "batch"
+        app.add_url_rule(f"{cls.ROUTE}/batch", view_func=batch_view)
         app.add_url_rule(f"{cls.ROUTE}/<key>", view_func=item_view)
 
+    @classmethod
+    def batch(cls, model: type[IdModel], field: str, key=lambda entry: entry):
+        """Validate the request's `field` list for a batch operation on `model` rows.
+
+        Returns a result per entry, in request order, and the entries to apply by id, each with its
+        result so the caller can still fail it. Entries with a missing, unknown or repeated id have
+        already failed.
+        """
+        entries = (request.get_json(silent=True) or {}).get(field)
+
+        if not isinstance(entries, list) or not entries:
+            raise ApiError(f"Expected a list of {field}", 400)
+
+        if len(entries) > BATCH_LIMIT:
+            raise ApiError(f"At most {BATCH_LIMIT} {field} per request", 413)
+
+        results = []
+        pending = {}
+
+        for entry in entries:
+            try:
+                oid = int(key(entry))
+            except (KeyError, TypeError, ValueError):
+                results.append({"id": None, "success": False, "error": "Invalid id"})
+                continue
+
+            result = {"id": oid, "success": True}
+            results.append(result)
+
+            if oid in pending:
+                result.update(success=False, error="Duplicate id")
+            else:
+                pending[oid] = (entry, result)
+
+        existing = set(db.session.scalars(select(model.id).where(model.id.in_(pending))))
+
+        for oid in pending.keys() - existing:
+            pending.pop(oid)[1].update(success=False, error="Not Found")
+
+        return results, pending
+
+    @classmethod
+    def version(cls, name: str, **kwargs):
+        """A cheap value that changes whenever the GET `name` would return different data.
+
+        Returning one enables ETags and conditional GETs; the default of `None` disables them.
+        """
+        return None
+
     @classmethod
     def create(cls):
         raise ApiError("Not Allowed", 405)
@@ -184,18 +350,27 @@ class ApiView(RoleView):
     def delete(cls, key):
         raise ApiError("Not Allowed", 405)
 
+    @classmethod
+    def update_many(cls):
+        raise ApiError("Not Allowed", 405)
+
+    @classmethod
+    def delete_many(cls):
+        raise ApiError("Not Allowed", 405)
+
 
 class Home(PageView):
     TEMPLATE_PATH = "pages/home.jinja"
     ROUTE = "/"
 
     def get_template_context(self, *args, **kwargs):
-        return dict(collection=Collection.get_highlighted_collection())
+        return dict(collection=Collection.get_highlighted_collection(), popular=Game.popular())
 
 
 class Login(FormView):
     TEMPLATE_PATH = "pages/login.jinja"
     ROUTE = "/login"
+    WRITES = False
 
     def get(self):
         if get_user() is not None:
@@ -228,6 +403,7 @@ class Logout(PageView):
 class Register(Login):
     TEMPLATE_PATH = "pages/register.jinja"
     ROUTE = "/register"
+    WRITES = True
 
     def handle_form_submission(self, *args, **kwargs):
         username = request.form["username"]
@@ -305,13 +481,115 @@ class UsersApi(ApiView):
 
         user.delete()
 
+    @classmethod
+    def update_many(cls):
+        results, pending = cls.batch(User, "items", key=lambda item: item["id"])
+        ids_by_role = defaultdict(list)
+
+        for user_id, (item, result) in pending.items():
+            try:
+                ids_by_role[User.Role[item["role"].upper()]].append(user_id)
+            except (AttributeError, KeyError):
+                result.update(success=False, error="Invalid role")
+
+        for role, ids in ids_by_role.items():
+            db.session.execute(update(User).where(User.id.in_(ids)).values(role=role))
+
+        db.session.commit()
+
+        return results
+
+    @classmethod
+    def delete_many(cls):
+        results, pending = cls.batch(User, "keys")
+        current_user = get_user()
+
+        if (self_delete := pending.pop(current_user.id, None)) is not None:
+            self_delete[1].update(success=False, error="Cannot delete self")
+
+        db.session.execute(delete(User).where(User.id.in_(pending)))
+        db.session.commit()
+
+        return results
+
+
+class JobsApi(ApiView):
+    ROUTE = "/api/jobs"
+
+    MINIMUM_ROLE = User.Role.ADMIN
+
+    @classmethod
+    def get_job(cls, key) -> Job:
+        if (job := Job.get_by_id(key)) is None:
+            raise ApiError("Not Found", 404)
+
+        return job
+
+    @classmethod
+    def list(cls):
+        stmt = Job.select()
+
+        if (status := request.args.get("status")) is not None:
+            try:
+                stmt = stmt.where(Job.status == Job.Status(status))
+            except ValueError:
+                raise ApiError("Unknown status", 400)
+
+        return Job.paginate(cls.page_num(), cls.per_page(), stmt=stmt)
+
+    @classmethod
+    def create(cls):
+        try:
+            job = enqueue(request.json.get("task"), request.json.get("arguments"))
+        except JobError as e:
+            raise ApiError(str(e), 400)
+
+        return job, 201
+
+    @classmethod
+    def read(cls, key):
+        return cls.get_job(key)
+
+    @classmethod
+    def update(cls, key):
+        job = cls.get_job(key)
+
+        if request.json.get("status") != str(Job.Status.QUEUED):
+            raise ApiError("Jobs can only be queued again", 400)
+
+        if job.status != Job.Status.FAILED:
+            raise ApiError("Only failed jobs can be retried", 409)
+
+        job.status = Job.Status.QUEUED
+        job.attempts = 0
+        job.run_after = datetime.now()
+
+        return job.save()
+
+    @classmethod
+    def delete(cls, key):
+        job = cls.get_job(key)
+
+        if job.status == Job.Status.RUNNING:
+            raise ApiError("Cannot delete a running job", 409)
+
+        job.delete()
+
 
 class GamesView(PageView):
     TEMPLATE_PATH = "pages/games.jinja"
     ROUTE = "/games"
 
     def get_template_context(self, *args, **kwargs):
-        return dict(page=Game.paginate(self.page_num(), 12))
+        stmt = self.filtered_games()
+        order_by = Game.popular_first() if request.args.get("sort") == "popular" else ()
+
+        return dict(
+            page=Game.paginate(self.page_num(), 12, stmt=stmt, order_by=order_by),
+            facets=Game.facets(stmt, FACET_LIMIT),
+            filters=self.game_filters(),
+            filtered=stmt is not None,
+        )
 
 
 class ListCollections(PageView):
@@ -358,9 +636,12 @@ class GameView(PageView):
     ROUTE = "/game/<int:game_id>"
 
     def get_template_context(self, game_id: int, *args, **kwargs):
-        game = Game.get_by_id(game_id)
+        if (game := Game.get_by_id(game_id)) is None:
+            abort(404)
+
+        view_counter.record(game.id)
 
-        return dict(game=game)
+        return dict(game=game, similar_games=game.similar_games())
 
 
 class ViewCollection(PageView):
@@ -370,7 +651,12 @@ class ViewCollection(PageView):
     def get_template_context(self, collection_id: int, *args, **kwargs):
         collection = Collection.get_by_id(collection_id)
 
-        return dict(collection=collection)
+        if collection is None:
+            abort(404)
+
+        collection.mark_viewed()
+
+        return dict(collection=collection, page=collection.games_page(self.page_num(), 24))
 
 
 class EditCollection(ViewCollection, FormView):
@@ -379,6 +665,15 @@ class EditCollection(ViewCollection, FormView):
 
     MINIMUM_ROLE = User.Role.EDITOR
 
+    def get_template_context(self, collection_id: int, *args, **kwargs):
+        # Not the inherited context, as editing is no view and the form needs no games page
+        collection = Collection.get_by_id(collection_id)
+
+        if collection is None:
+            abort(404)
+
+        return dict(collection=collection)
+
     def handle_form_submission(self, collection_id: int, *args, **kwargs):
         name = request.form["name"]
         description = request.form.get("description")
@@ -416,16 +711,97 @@ class EditCollection(ViewCollection, FormView):
 class GamesApi(ApiView):
     ROUTE = "/api/games"
 
+    @classmethod
+    def version(cls, name: str, **kwargs):
+        # Edits to a game's tags or publishers move its `modified` too
+        return Game.version()
+
     @classmethod
     def list(cls):
         query = request.args.get("q")
 
-        stmt = Game.select()
+        filtered = cls.filtered_games()
+        stmt = Game.select() if filtered is None else filtered
 
         if query:
             stmt = stmt.where(Game.name.regexp_match(query, "i"))
 
-        return Game.paginate(cls.page_num(), cls.per_page(), stmt=stmt)
+        stmt = stmt.options(selectinload(Game.publishers), selectinload(Game.tags))
+
+        page = Game.paginate(cls.page_num(), cls.per_page(), stmt=stmt)
+
+        if request.args.get("facets"):
+            facet_stmt = stmt if query or filtered is not None else None
+
+            return dict(page.serialize(), facets=Game.facets(facet_stmt, FACET_LIMIT))
+
+        return page
+
+
+class GameAutocompleteApi(ApiView):
+    ROUTE = "/api/games/autocomplete"
+
+    @classmethod
+    def list(cls):
+        query = request.args.get("q", "")
+        limit = cls.per_page(default=10)
+
+        matches = game_names.search(query, limit)
+
+        return {"items": [{"id": game_id, "name": name} for game_id, name in matches]}
+
+
+class TagsApi(ApiView):
+    ROUTE = "/api/tags"
+
+    @classmethod
+    def version(cls, name: str, **kwargs):
+        # Tag counts only move when a game's tags change, which touches the game
+        return Game.version()
+
+    @classmethod
+    def list(cls):
+        """Tags with games, most used first, optionally of one `type`."""
+        stmt = Tag.select().where(Tag.game_count > 0)
+
+        if (tag_type := request.args.get("type")) is not None:
+            try:
+                stmt = stmt.where(Tag.type == Tag.Type(tag_type))
+            except ValueError:
+                raise ApiError("Unknown type", 400)
+
+        return Tag.paginate(cls.page_num(), cls.per_page(), stmt=stmt, order_by=Tag.popular_first())
+
+    @classmethod
+    def read(cls, key):
+        if (tag := Tag.get_by_id(key)) is None:
+            raise ApiError("Not Found", 404)
+
+        return tag
+
+
+class PublishersApi(ApiView):
+    ROUTE = "/api/publishers"
+
+    @classmethod
+    def version(cls, name: str, **kwargs):
+        return Game.version()
+
+    @classmethod
+    def list(cls):
+        """Publishers with games, most published first."""
+        stmt = Publisher.select().where(Publisher.game_count > 0)
+
+        return Publisher.paginate(
+            cls.page_num(), cls.per_page(), stmt=stmt, order_by=Publisher.popular_first()
+        )
+
+    @classmethod
+    def read(cls, key):
+        if (publisher := Publisher.get_by_id(key)) is None:
+            raise ApiError("Not Found", 404)
+
+        return publisher
 
 
 class GameImage(RoleView):
@@ -435,7 +811,71 @@ class GameImage(RoleView):
         if (game := Game.get_by_bgg_id(game_id)) is None or game.image_path is None:
             return render_template("pages/404.jinja")
 
-        return send_file(game.image_path, mimetype="image/png")
+        if (url := storage.url(game.image_path)) is not None:
+            response = redirect(url)
+            response.cache_control.max_age = current_app.config["S3_PRESIGN_SECONDS"] // 2
+
+            image_redirects.inc()
+
+            return response
+
+        response = send_file(storage.path(game.image_path), mimetype="image/png")
+
+        image_bytes.inc(response.content_length or 0)
+
+        return response
+
+
+class ProfilesApi(ApiView):
+    ROUTE = "/api/profiles"
+
+    MINIMUM_ROLE = User.Role.ADMIN
+
+    @classmethod
+    def list(cls):
+        return {"items": profiler.list()}
+
+    @classmethod
+    def read(cls, key):
+        if (profile := profiler.read(key)) is None:
+            raise ApiError("Not Found", 404)
+
+        return profile
+
+    @classmethod
+    def delete(cls, key):
+        if not profiler.delete(key):
+            raise ApiError("Not Found", 404)
+
+
+class ProfileDownload(RoleView):
+    ROUTE = "/api/profiles/<key>/download"
+
+    MINIMUM_ROLE = User.Role.ADMIN
+
+    def get(self, key):
+        if (path := profiler.stats_path(key)) is None:
+            abort(404)
+
+        return send_file(path, as_attachment=True, download_name=f"{key}.prof")
+
+
+class MetricsView(RoleView):
+    ROUTE = "/metrics"
+
+    MINIMUM_ROLE = User.Role.ADMIN
+
+    @classmethod
+    def user_allowed(cls):
+        token = current_app.config.get("METRICS_TOKEN")
+
+        if token and request.headers.get("Authorization") == f"Bearer {token}":
+            return True
+
+        return super().user_allowed()
+
+    def get(self):
+        return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
 
 
 class ReportForm(FormView):
@@ -474,3 +914,29 @@ class ReportsView(PageView):
 
     def get_template_context(self, *args, **kwargs):
         return {"page": Report.paginate(self.page_num(), 15)}
+
+
+class ReportsApi(ApiView):
+    ROUTE = "/api/reports"
+
+    MINIMUM_ROLE = User.Role.EDITOR
+
+    @classmethod
+    def list(cls):
+        return Report.paginate(cls.page_num(), cls.per_page())
+
+    @classmethod
+    def delete(cls, key):
+        if (report := Report.get_by_id(key)) is None:
+            raise ApiError("Not Found", 404)
+
+        report.delete()
+
+    @classmethod
+    def delete_many(cls):
+        results, pending = cls.batch(Report, "keys")
+
+        db.session.execute(delete(Report).where(Report.id.in_(pending)))
+        db.session.commit()
+
+        return results
@@ -0,0 +1,83 @@
+"""Gunicorn settings, tuned per deployment through environment variables.
+
+GUNICORN_WORKER_CLASS  sync (default), or gthread to overlap slow database and BGG waits
+WEB_CONCURRENCY        worker processes, default 2 * CPUs + 1 (CPUs + 1 for gthread)
+GUNICORN_THREADS       threads per gthread worker, default 4
+GUNICORN_KEEPALIVE     seconds to hold idle keep-alive connections, default 5
+GUNICORN_MAX_REQUESTS  requests before a worker is recycled (plus up to 10% jitter), default 1000
+GUNICORN_PRELOAD       import the app once in the master before forking, default true
+METRICS_DIR            shared directory for the per-worker metrics files (see gamecafe.metrics)
+"""
+
+import os
+from multiprocessing import cpu_count
+
+from sqlalchemy.exc import SQLAlchemyError
+
+WORKER_CLASSES = ("sync", "gthread")
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(
+        f"Unknown GUNICORN_WORKER_CLASS {worker_class!r}, expected one of {', '.join(WORKER_CLASSES)}"
+    )
+
+wsgi_app = "gamecafe:create_app()"
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:80")
+
+# Threaded workers overlap I/O waits themselves, so they need fewer processes
+default_workers = cpu_count() * 2 + 1 if worker_class == "sync" else cpu_count() + 1
+workers = int(os.environ.get("WEB_CONCURRENCY", default_workers))
+threads = int(os.environ.get("GUNICORN_THREADS", 4)) if worker_class == "gthread" else 1
+
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def on_starting(server):
+    if metrics_dir := os.environ.get("METRICS_DIR"):
+        from gamecafe.metrics import metrics
+
+        metrics.reset(metrics_dir)
+
+
+def post_fork(server, worker):
+    # With `preload_app` the master has already opened connections while creating the app;
+    # a worker must never reuse a socket it shares with its siblings.
+    from gamecafe.database import db
+    from gamecafe.metrics import metrics
+
+    db.dispose()
+
+    # Nor report the master's samples, which every worker would otherwise count again
+    metrics.clear()
+
+
+def worker_exit(server, worker):
+    from gamecafe.database import db
+    from gamecafe.metrics import metrics
+    from gamecafe.popularity import view_counter
+
+    metrics.flush()
+
+    try:
+        view_counter.flush()
+    except SQLAlchemyError:
+        server.log.exception("Flushing game views failed, dropping them")
+
+    # Workers are recycled every `max_requests`, which makes this a periodic SQLite maintenance
+    db.optimize()
+
+
+def child_exit(server, worker):
+    if metrics_dir := os.environ.get("METRICS_DIR"):
+        from gamecafe.metrics import metrics
+
+        metrics.mark_process_dead(worker.pid, metrics_dir)
@@ -0,0 +1,64 @@
+"""Every hot query from `gamecafe.query_plans` must stay index-backed.
+
+SQLite runs against a temporary database. The repository's first migrations alter constraints,
+which SQLite cannot do, so its schema is created from the models, which declare every index the
+migrations add. Set `TEST_POSTGRES_URI` to an empty scratch database to also check Postgres after
+running the migrations against it.
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config as AlembicConfig
+
+from gamecafe import create_app
+from gamecafe.config import Config
+from gamecafe.database import db
+from gamecafe.query_plans import full_scans
+
+ROOT = Path(__file__).parents[1]
+POSTGRES_URI = os.environ.get("TEST_POSTGRES_URI")
+
+
+def migrate():
+    config = AlembicConfig(ROOT / "alembic.ini")
+    config.set_main_option("script_location", str(ROOT / "gamecafe" / "alembic"))
+
+    command.upgrade(config, "head")
+
+
+@pytest.fixture(
+    params=[
+        "sqlite",
+        pytest.param(
+            "postgresql",
+            marks=pytest.mark.skipif(POSTGRES_URI is None, reason="TEST_POSTGRES_URI is not set"),
+        ),
+    ]
+)
+def app(request, tmp_path, monkeypatch):
+    uri = f"sqlite:///{tmp_path / 'database.db'}" if request.param == "sqlite" else POSTGRES_URI
+
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", uri)
+    monkeypatch.setattr(Config, "IMAGE_STORAGE_ROOT", str(tmp_path / "images"))
+
+    if request.param == "postgresql":
+        migrate()
+
+    app = create_app()
+
+    with app.app_context():
+        if request.param == "sqlite":
+            db.Base.metadata.create_all(db.engine)
+
+        yield app
+
+        db.engine.dispose()
+
+
+def test_hot_queries_use_indexes(app):
+    scans = {name: details for name, details in full_scans().items() if details}
+
+    assert scans == {}